@@ -8,10 +8,13 @@ import os
 import tempfile
 import time
 import json
-import requests
+import httpx
+from starlette.concurrency import run_in_threadpool
 from typing import List, Dict, Any, Optional
 import shutil
 import re
+import hashlib
+from collections import OrderedDict
 from datetime import datetime
 
 # Create FastAPI app
@@ -65,6 +68,13 @@ FILE_SIZE_LIMITS = {
     "application/vnd.openxmlformats-officedocument.wordprocessingml.document": 10
 }
 
+# Downloads: chunk size in bytes, timeouts in seconds (DOWNLOAD_TIMEOUT
+# bounds the whole transfer)
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+DOWNLOAD_TIMEOUT = 300
+
+http_client: Optional[httpx.AsyncClient] = None
+
 # Helper functions
 def cleanup_files(file_paths: List[str]) -> None:
     """Clean up temporary files."""
@@ -78,24 +88,66 @@ def cleanup_files(file_paths: List[str]) -> None:
         except Exception as e:
             print(f"Error cleaning up {file_path}: {str(e)}")
 
-def download_file(file_url: str, file_name: str) -> str:
-    """Download file from URL to temporary location."""
-    response = requests.get(file_url, stream=True)
-    if response.status_code != 200:
-        raise HTTPException(status_code=400, detail="Failed to download file")
-    
-    file_path = os.path.join(TEMP_DIR, file_name)
-    with open(file_path, 'wb') as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
+def get_http_client() -> httpx.AsyncClient:
+    """Shared keep-alive HTTP client for downloads."""
+    global http_client
+    if http_client is None:
+        http_client = httpx.AsyncClient(timeout=httpx.Timeout(30, connect=10), follow_redirects=True)
+    return http_client
+
+async def download_file(file_url: str, file_name: str, max_bytes: Optional[int] = None) -> str:
+    """Stream a file from URL to a temporary location, aborting once it exceeds max_bytes."""
+    # A directory per download, so concurrent requests for the same file name never collide
+    file_path = os.path.join(tempfile.mkdtemp(dir=TEMP_DIR), os.path.basename(file_name))
+    deadline = time.monotonic() + DOWNLOAD_TIMEOUT
+    try:
+        async with get_http_client().stream("GET", file_url) as response:
+            if response.status_code != 200:
+                raise HTTPException(status_code=400, detail="Failed to download file")
+            
+            content_length = response.headers.get("content-length")
+            if max_bytes is not None and content_length and content_length.isdigit() and int(content_length) > max_bytes:
+                raise HTTPException(status_code=400, detail="File exceeds size limit")
+            
+            received = 0
+            with open(file_path, 'wb') as f:
+                async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                    received += len(chunk)
+                    if max_bytes is not None and received > max_bytes:
+                        raise HTTPException(status_code=400, detail="File exceeds size limit")
+                    if time.monotonic() > deadline:
+                        raise HTTPException(status_code=504, detail="Timed out downloading file")
+                    await run_in_threadpool(f.write, chunk)
+    except Exception as e:
+        shutil.rmtree(os.path.dirname(file_path), ignore_errors=True)
+        if isinstance(e, HTTPException):
+            raise
+        if isinstance(e, httpx.TimeoutException):
+            raise HTTPException(status_code=504, detail="Timed out downloading file")
+        raise HTTPException(status_code=400, detail=f"Failed to download file: {str(e)}")
     
     return file_path
 
-def save_upload_file(upload_file: UploadFile) -> str:
-    """Save uploaded file to temporary location."""
-    file_path = os.path.join(TEMP_DIR, upload_file.filename)
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(upload_file.file, buffer)
+async def save_upload_file(upload_file: UploadFile, max_bytes: Optional[int] = None) -> str:
+    """Copy an uploaded file to a temporary location, aborting once it exceeds max_bytes."""
+    # Only the base name of the client's file name is used, in a directory per upload
+    file_name = os.path.basename(upload_file.filename or "") or "upload"
+    file_path = os.path.join(tempfile.mkdtemp(dir=TEMP_DIR), file_name)
+    try:
+        received = 0
+        with open(file_path, 'wb') as f:
+            while True:
+                chunk = await upload_file.read(DOWNLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                received += len(chunk)
+                if max_bytes is not None and received > max_bytes:
+                    raise HTTPException(status_code=400, detail="File exceeds size limit")
+                await run_in_threadpool(f.write, chunk)
+    except BaseException:
+        shutil.rmtree(os.path.dirname(file_path), ignore_errors=True)
+        raise
+    
     return file_path
 
 def check_file_size(file_path: str, file_type: str) -> bool:
@@ -123,70 +175,82 @@ def process_docx_file(file_path: str) -> str:
     except Exception as e:
         return f"Error processing Word document: {str(e)}"
 
+# Parsed spreadsheets keyed by content hash, so a file read for its text is
+# not parsed again for its summary. Bounded by the frames' in-memory size
+# (deep, so object columns count their strings), least recently used first.
+DATAFRAME_CACHE_MAX_BYTES = 256 * 1024 * 1024
+_dataframe_cache = OrderedDict()
+_dataframe_cache_bytes = 0
+
+def load_dataframe(file_path: str):
+    """Parse a CSV or Excel file, reusing the result for identical file contents."""
+    global _dataframe_cache_bytes
+    import pandas as pd
+    
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    key = digest.hexdigest()
+    
+    if key in _dataframe_cache:
+        _dataframe_cache.move_to_end(key)
+        return _dataframe_cache[key][0]
+    
+    if file_path.endswith('.csv'):
+        df = pd.read_csv(file_path)
+    else:  # xlsx or xls
+        df = pd.read_excel(file_path)
+    
+    size = int(df.memory_usage(deep=True).sum())
+    if size > DATAFRAME_CACHE_MAX_BYTES:
+        # Larger than the whole budget: not worth evicting everything for
+        return df
+    _dataframe_cache[key] = (df, size)
+    _dataframe_cache_bytes += size
+    while _dataframe_cache_bytes > DATAFRAME_CACHE_MAX_BYTES:
+        _, (_, evicted_size) = _dataframe_cache.popitem(last=False)
+        _dataframe_cache_bytes -= evicted_size
+    return df
+
 def process_excel_file(file_path: str) -> str:
     """Extract text from Excel file."""
     try:
-        import pandas as pd
-        if file_path.endswith('.csv'):
-            df = pd.read_csv(file_path)
-        else:  # xlsx or xls
-            df = pd.read_excel(file_path)
+        df = load_dataframe(file_path)
         return df.to_string()
     except ImportError:
         return "Pandas not installed. Cannot process Excel files."
     except Exception as e:
         return f"Error processing Excel file: {str(e)}"
 
+# Entity patterns combined into one alternation so the text is scanned once.
+# Where matches start at the same position, the earlier pattern wins. The
+# address pattern is bounded and word-aligned so it cannot backtrack badly
+# on long inputs.
+ENTITY_PATTERNS = {
+    "EMAIL": (r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b', 0.9),
+    "MONEY": (r'\$\s*\d+(?:\.\d{2})?', 0.9),
+    "DATE": (r'\b\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}\b', 0.8),
+    "PHONE_NUMBER": (r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b', 0.85),
+    "ADDRESS": (r'\b\d{1,6}\s+(?:[A-Za-z0-9]+[\s,]+){0,8}?'
+                r'(?:street|st|avenue|ave|road|rd|boulevard|blvd|drive|dr|lane|ln|way|parkway|pkwy)\b', 0.7),
+}
+
+ENTITY_SCANNER = re.compile(
+    "|".join(f"(?P<{entity_type}>{pattern})" for entity_type, (pattern, _) in ENTITY_PATTERNS.items()),
+    re.IGNORECASE
+)
+
 def extract_entities(text: str) -> List[Dict[str, Any]]:
     """Extract entities from text - simplified version."""
-    entities = []
-    
-    # Look for emails
-    email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-    for match in re.finditer(email_pattern, text):
-        entities.append({
-            "type": "EMAIL",
-            "value": match.group(0),
-            "confidence": 0.9
-        })
-    
-    # Look for dates
-    date_pattern = r'\b\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}\b'
-    for match in re.finditer(date_pattern, text):
-        entities.append({
-            "type": "DATE",
+    return [
+        {
+            "type": match.lastgroup,
             "value": match.group(0),
-            "confidence": 0.8
-        })
-    
-    # Look for phone numbers
-    phone_pattern = r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b'
-    for match in re.finditer(phone_pattern, text):
-        entities.append({
-            "type": "PHONE_NUMBER",
-            "value": match.group(0),
-            "confidence": 0.85
-        })
-    
-    # Look for monetary amounts
-    money_pattern = r'\$\s*\d+(?:\.\d{2})?'
-    for match in re.finditer(money_pattern, text):
-        entities.append({
-            "type": "MONEY",
-            "value": match.group(0),
-            "confidence": 0.9
-        })
-    
-    # Look for addresses (very simplified)
-    address_pattern = r'\b\d+\s+[A-Za-z0-9\s,]+(?:street|st|avenue|ave|road|rd|boulevard|blvd|drive|dr|lane|ln|way|parkway|pkwy)\b'
-    for match in re.finditer(address_pattern, text, re.IGNORECASE):
-        entities.append({
-            "type": "ADDRESS",
-            "value": match.group(0),
-            "confidence": 0.7
-        })
-    
-    return entities
+            "confidence": ENTITY_PATTERNS[match.lastgroup][1]
+        }
+        for match in ENTITY_SCANNER.finditer(text)
+    ]
 
 def detect_language(text: str) -> str:
     """Detect language of the text."""
@@ -202,14 +266,9 @@ def detect_language(text: str) -> str:
 def create_dataframe_summary(text: str, file_path: str = None) -> Dict[str, Any]:
     """Create a data structure from text or a structured data file."""
     try:
-        import pandas as pd
-        
         # If we have a file path and it's a structured data file
         if file_path and (file_path.endswith('.csv') or file_path.endswith('.xlsx') or file_path.endswith('.xls')):
-            if file_path.endswith('.csv'):
-                df = pd.read_csv(file_path)
-            else:
-                df = pd.read_excel(file_path)
+            df = load_dataframe(file_path)
                 
             # Get basic dataframe info
             rows, cols = df.shape
@@ -286,20 +345,31 @@ def create_dataframe_summary(text: str, file_path: str = None) -> Dict[str, Any]
 @app.post("/process", response_model=ProcessingResponse)
 async def process_document(file_request: FileRequest, background_tasks: BackgroundTasks):
     """Process document and extract text and entities."""
+    return await run_processing(file_request, background_tasks)
+
+async def run_processing(
+    file_request: FileRequest,
+    background_tasks: BackgroundTasks,
+    upload: Optional[UploadFile] = None
+) -> ProcessingResponse:
+    """Process a document from its file_url, or from `upload` when given."""
     start_time = time.time()
     temp_files = []
     
     try:
         print(f"Processing request for file: {file_request.file_name}")
         
-        # Download file
-        file_path = download_file(file_request.file_url, file_request.file_name)
-        temp_files.append(file_path)
-        
-        # Check file size
-        if not check_file_size(file_path, file_request.file_type):
+        if file_request.file_type not in FILE_SIZE_LIMITS:
             raise HTTPException(status_code=400, detail=f"File exceeds size limit for {file_request.file_type}")
         
+        # Download file; the size limit is enforced during the transfer
+        max_bytes = int(FILE_SIZE_LIMITS[file_request.file_type] * 1024 * 1024)
+        if upload is not None:
+            file_path = await save_upload_file(upload, max_bytes)
+        else:
+            file_path = await download_file(file_request.file_url, file_request.file_name, max_bytes)
+        temp_files.append(os.path.dirname(file_path))
+        
         # Process file based on type
         text = ""
         
@@ -321,12 +391,11 @@ async def process_document(file_request: FileRequest, background_tasks: Backgrou
         entities = extract_entities(text)
         
         # Create entities summary
+        # Avoid duplicates: a dict per type is an ordered set, so this stays linear
         entities_summary = {}
         for entity in entities:
-            if entity["type"] not in entities_summary:
-                entities_summary[entity["type"]] = []
-            if entity["value"] not in entities_summary[entity["type"]]:
-                entities_summary[entity["type"]].append(entity["value"])
+            entities_summary.setdefault(entity["type"], {})[entity["value"]] = None
+        entities_summary = {entity_type: list(values) for entity_type, values in entities_summary.items()}
         
         # Create data frame
         data_frame = create_dataframe_summary(text, file_path)
@@ -358,36 +427,30 @@ async def process_document(file_request: FileRequest, background_tasks: Backgrou
             metadata=metadata
         )
         
+    except HTTPException:
+        cleanup_files(temp_files)
+        raise
     except Exception as e:
         # Clean up any temporary files
         background_tasks.add_task(cleanup_files, temp_files)
         print(f"Error processing file: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/upload")
-async def upload_file(file: UploadFile = File(...), file_id: str = Form(...)):
-    """Direct file upload endpoint"""
-    try:
-        # Save the uploaded file
-        file_path = save_upload_file(file)
-        
-        # Get the file type
-        file_type = file.content_type or "application/octet-stream"
-        
-        # Process based on file type - this is a simplified example
-        text = "File uploaded successfully. Add processing logic here."
-        
-        # Return response
-        return {
-            "file_id": file_id,
-            "file_name": file.filename,
-            "file_type": file_type,
-            "size": os.path.getsize(file_path),
-            "message": "File uploaded successfully",
-            "sample_text": text[:100] + "..." if len(text) > 100 else text
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+@app.post("/upload", response_model=ProcessingResponse)
+async def upload_file(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    file_id: str = Form(...),
+    file_type: Optional[str] = Form(None)
+):
+    """Direct file upload endpoint: process the uploaded file like /process, without a file_url"""
+    file_request = FileRequest(
+        file_id=file_id,
+        file_url="",
+        file_type=file_type or file.content_type or "application/octet-stream",
+        file_name=os.path.basename(file.filename or "") or file_id
+    )
+    return await run_processing(file_request, background_tasks, upload=file)
 
 @app.get("/")
 def read_root():
@@ -436,6 +499,14 @@ async def log_requests(request: Request, call_next):
     
     return response
 
+@app.on_event("shutdown")
+async def close_http_client():
+    """Close the shared download client."""
+    global http_client
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
     print(f"Starting FastAPI server on port {port}")
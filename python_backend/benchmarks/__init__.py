@@ -0,0 +1,2 @@
+
+# Benchmarks package initialization
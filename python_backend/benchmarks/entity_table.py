@@ -0,0 +1,74 @@
+"""
+Micro-benchmark: entity table and summary construction vs. the previous
+cell-by-cell rows and list-membership de-dup.
+
+Run from python_backend/:
+    python -m benchmarks.entity_table
+"""
+import random
+import time
+
+import pandas as pd
+
+from models.schemas import EntityModel
+from services.dataframe_service import create_dataframe_from_entities, summarize_entities
+
+ENTITY_TYPES = ["EMAIL", "PHONE", "DATE", "MONEY", "ADDRESS", "PERSON", "ORG", "GPE"]
+
+def legacy_table(entities: list) -> pd.DataFrame:
+    entity_groups = {}
+    for entity in entities:
+        if entity.type not in entity_groups:
+            entity_groups[entity.type] = []
+        entity_groups[entity.type].append(entity.value)
+    headers = list(entity_groups.keys())
+    max_entities = max([len(group) for group in entity_groups.values()], default=0)
+    rows = []
+    for i in range(max_entities):
+        row = []
+        for entity_type in headers:
+            if i < len(entity_groups[entity_type]):
+                row.append(entity_groups[entity_type][i])
+            else:
+                row.append("")
+        rows.append(row)
+    return pd.DataFrame(rows, columns=headers)
+
+def legacy_summary(entities: list) -> dict:
+    entities_summary = {}
+    for entity in entities:
+        if entity.type not in entities_summary:
+            entities_summary[entity.type] = []
+        if entity.value not in entities_summary[entity.type]:
+            entities_summary[entity.type].append(entity.value)
+    return entities_summary
+
+def make_entities(count: int, distinct: int) -> list:
+    rng = random.Random(0)
+    # Skewed type mix so columns have different lengths and need padding
+    weights = [2 ** -idx for idx in range(len(ENTITY_TYPES))]
+    types = rng.choices(ENTITY_TYPES, weights=weights, k=count)
+    return [
+        EntityModel.construct(type=entity_type, value=f"{entity_type.lower()}-{rng.randrange(distinct)}",
+                              confidence=0.9, position={"start": idx, "end": idx + 1})
+        for idx, entity_type in enumerate(types)
+    ]
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+def main() -> None:
+    print(f"{'entities':>10}{'table legacy (s)':>18}{'table (s)':>11}{'summary legacy (s)':>20}{'summary (s)':>13}")
+    for count in (10_000, 100_000, 1_000_000, 3_000_000):
+        entities = make_entities(count, distinct=max(count // 10, 1))
+        table_time = timed(create_dataframe_from_entities, entities)
+        summary_time = timed(summarize_entities, entities)
+        legacy_table_time = timed(legacy_table, entities)
+        # The legacy summary is quadratic in distinct values; only time it at small sizes
+        legacy_summary_time = f"{timed(legacy_summary, entities):.3f}" if count <= 100_000 else "skipped"
+        print(f"{count:>10}{legacy_table_time:>18.3f}{table_time:>11.3f}{legacy_summary_time:>20}{summary_time:>13.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Benchmark: streaming xlsx export vs. the previous pd.ExcelWriter export.
+
+Reports rows/sec and peak Python memory (tracemalloc) for each size.
+
+Run from python_backend/:
+    python -m benchmarks.excel_export
+"""
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from models.tabular import TabularData
+from services.dataframe_service import export_to_excel
+
+def legacy_export(table: TabularData, output_path: str) -> None:
+    with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
+        for sheet_name, sheet_df in table.iter_sheets():
+            sheet_df.to_excel(writer, sheet_name=sheet_name, index=False)
+
+def make_table(rows: int) -> TabularData:
+    rng = np.random.default_rng(0)
+    return TabularData(pd.DataFrame({
+        "name": [f"customer {idx}" for idx in range(rows)],
+        "email": [f"user{idx}@example.com" for idx in range(rows)],
+        "amount": rng.uniform(0, 10_000, rows).round(2),
+        "quantity": rng.integers(0, 100, rows),
+    }))
+
+def measure(func, table: TabularData, output_path: str):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(table, output_path)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / (1024 * 1024)
+
+def main() -> None:
+    print(f"{'rows':>8}{'legacy rows/s':>15}{'legacy peak MB':>16}{'stream rows/s':>15}{'stream peak MB':>16}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = os.path.join(tmp_dir, "export.xlsx")
+        for rows in (10_000, 100_000, 300_000):
+            table = make_table(rows)
+            legacy_time, legacy_peak = measure(legacy_export, table, output_path)
+            stream_time, stream_peak = measure(export_to_excel, table, output_path)
+            print(f"{rows:>8}{rows / legacy_time:>15,.0f}{legacy_peak:>16.1f}"
+                  f"{rows / stream_time:>15,.0f}{stream_peak:>16.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 
 # Configuration settings for the application
+import os
 
 # File size limits in MB
 FILE_SIZE_LIMITS = {
@@ -16,3 +17,112 @@ FILE_SIZE_LIMITS = {
 
 # Maximum number of rows per sheet
 MAX_ROWS_PER_SHEET = 1000
+
+# Worker pools: CPU-bound stages (OCR, NER, pandas) run in a process pool,
+# blocking I/O (downloads, file reads) runs in a thread pool
+CPU_WORKERS = int(os.environ.get("CPU_WORKERS", os.cpu_count() or 1))
+IO_WORKERS = int(os.environ.get("IO_WORKERS", 16))
+
+# Scratch space: each process keeps its temp files in a directory under
+# SCRATCH_DIR (default: the system temp dir; point it at a tmpfs such as
+# /dev/shm to keep them in RAM). New work is rejected with 503 while the
+# directories of all processes under SCRATCH_DIR hold more than
+# SCRATCH_MAX_BYTES. Every SCRATCH_SWEEP_INTERVAL
+# seconds, job files older than SCRATCH_TTL seconds and the directories of
+# processes that are no longer running are removed.
+SCRATCH_DIR = os.environ.get("SCRATCH_DIR") or None
+SCRATCH_MAX_BYTES = int(os.environ.get("SCRATCH_MAX_BYTES", 10 * 1024 * 1024 * 1024))
+SCRATCH_TTL = int(os.environ.get("SCRATCH_TTL", 6 * 3600))
+SCRATCH_SWEEP_INTERVAL = int(os.environ.get("SCRATCH_SWEEP_INTERVAL", 300))
+
+# Source file downloads: one pooled keep-alive HTTP client per process.
+# Timeouts are in seconds; DOWNLOAD_TIMEOUT bounds the whole transfer so a
+# slow source cannot hold a job forever.
+DOWNLOAD_CHUNK_SIZE = int(os.environ.get("DOWNLOAD_CHUNK_SIZE", 256 * 1024))
+DOWNLOAD_CONNECT_TIMEOUT = float(os.environ.get("DOWNLOAD_CONNECT_TIMEOUT", 10))
+DOWNLOAD_READ_TIMEOUT = float(os.environ.get("DOWNLOAD_READ_TIMEOUT", 30))
+DOWNLOAD_TIMEOUT = float(os.environ.get("DOWNLOAD_TIMEOUT", 300))
+DOWNLOAD_MAX_CONNECTIONS = int(os.environ.get("DOWNLOAD_MAX_CONNECTIONS", IO_WORKERS))
+
+# Admission control for /process: jobs running at once, and jobs allowed to
+# wait for a slot before new requests are rejected with 503
+MAX_INFLIGHT_JOBS = int(os.environ.get("MAX_INFLIGHT_JOBS", CPU_WORKERS * 2))
+MAX_QUEUED_JOBS = int(os.environ.get("MAX_QUEUED_JOBS", 32))
+
+# Asynchronous job API: concurrent job workers, jobs allowed to wait in the
+# queue, and how long finished jobs and their results are kept (seconds)
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", MAX_INFLIGHT_JOBS))
+MAX_PENDING_JOBS = int(os.environ.get("MAX_PENDING_JOBS", 1000))
+JOB_RESULT_TTL = int(os.environ.get("JOB_RESULT_TTL", 3600))
+
+# PDF pages rendered and OCR'd at once per document; each page in flight
+# holds a 300 DPI bitmap, so this caps memory on large scanned PDFs
+OCR_PAGE_CONCURRENCY = int(os.environ.get("OCR_PAGE_CONCURRENCY", CPU_WORKERS))
+
+# PDF pages whose text layer has fewer characters than this (and that contain
+# images) are treated as scanned and OCR'd; other pages are never rendered
+MIN_TEXT_LAYER_CHARS = int(os.environ.get("MIN_TEXT_LAYER_CHARS", 20))
+
+# Result cache for /process, keyed by the SHA-256 of the file contents.
+# Bump PIPELINE_VERSION whenever processing output changes so stale entries
+# stop matching. The disk tier is only used when RESULT_CACHE_DIR is set.
+PIPELINE_VERSION = "9"
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+RESULT_CACHE_DIR = os.environ.get("RESULT_CACHE_DIR")
+RESULT_CACHE_DISK_MAX_BYTES = int(os.environ.get("RESULT_CACHE_DISK_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+
+# spaCy NER batching: texts per nlp.pipe batch and spaCy worker processes
+# (keep NER_N_PROCESS at 1 when CPU_WORKERS already uses every core)
+NER_BATCH_SIZE = int(os.environ.get("NER_BATCH_SIZE", 64))
+NER_N_PROCESS = int(os.environ.get("NER_N_PROCESS", 1))
+
+# /process/batch: documents from all batches processed at once, most documents
+# per request, and how long (seconds) NER work waits to be batched with
+# other documents' texts before it runs anyway
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", IO_WORKERS))
+BATCH_MAX_FILES = int(os.environ.get("BATCH_MAX_FILES", 1000))
+NER_BATCH_WAIT = float(os.environ.get("NER_BATCH_WAIT", 0.05))
+
+# Long texts are split into chunks of about NER_CHUNK_CHARS characters on
+# paragraph/sentence boundaries, overlapping by NER_CHUNK_OVERLAP characters,
+# so spaCy never builds one huge Doc (and max_length is never hit)
+NER_CHUNK_CHARS = int(os.environ.get("NER_CHUNK_CHARS", 100000))
+NER_CHUNK_OVERLAP = int(os.environ.get("NER_CHUNK_OVERLAP", 500))
+
+# Load the spaCy model (and look up Tesseract) at startup instead of on the
+# first request. Loading happens before the process pool starts, so forked
+# workers inherit the loaded model.
+WARMUP_MODELS = os.environ.get("WARMUP_MODELS", "true").lower() in ("1", "true", "yes")
+
+# Spreadsheets are parsed into pages of MAX_ROWS_PER_SHEET rows stored on
+# disk (as Parquet) while they are read, so /process never holds a whole
+# sheet in memory. Pages are kept in SPREADSHEET_CACHE_DIR (default: a
+# directory under the service temp dir), keyed by content hash, up to
+# SPREADSHEET_CACHE_MAX_BYTES in total. They are the one parsed copy of an
+# upload shared by /analyze, /process and the process pool workers, and
+# back the result tables of spreadsheets.
+SPREADSHEET_CACHE_DIR = os.environ.get("SPREADSHEET_CACHE_DIR")
+SPREADSHEET_CACHE_MAX_BYTES = int(os.environ.get("SPREADSHEET_CACHE_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+
+# Memory budget for result tables kept after /process returns, served by
+# the /results/{file_id}/table download endpoint
+TABLE_STORE_MAX_BYTES = int(os.environ.get("TABLE_STORE_MAX_BYTES", 512 * 1024 * 1024))
+
+# Sheet pages returned inline by /process; the rest are fetched from the
+# /results/{file_id}/sheets and /results/{file_id}/rows endpoints
+INLINE_SHEETS = int(os.environ.get("INLINE_SHEETS", 1))
+
+# Excel exports of result tables are built on first download and kept in
+# EXPORT_CACHE_DIR (default: a directory under the service temp dir)
+EXPORT_CACHE_DIR = os.environ.get("EXPORT_CACHE_DIR")
+EXPORT_CACHE_MAX_BYTES = int(os.environ.get("EXPORT_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+
+# Reports generated by /export are kept in EXPORT_DIR (default: a directory
+# under the service temp dir) for EXPORT_TTL seconds, served by /exports/{id}
+EXPORT_DIR = os.environ.get("EXPORT_DIR")
+EXPORT_TTL = int(os.environ.get("EXPORT_TTL", 3600))
+
+# Optional branded templates for /export pptx and docx reports; read once per
+# worker process (default: the python-pptx / python-docx built-in templates)
+EXPORT_PPTX_TEMPLATE = os.environ.get("EXPORT_PPTX_TEMPLATE")
+EXPORT_DOCX_TEMPLATE = os.environ.get("EXPORT_DOCX_TEMPLATE")
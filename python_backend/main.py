@@ -1,21 +1,42 @@
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+import time
+_import_start = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import uvicorn
+import asyncio
 import os
 import tempfile
-import time
+import importlib.metadata
 from typing import List, Optional
 import shutil
 import sys
 
-from models.schemas import FileRequest, ProcessingResponse, AnalysisRequest, AnalysisResponse, ExportRequest, ExportResponse
+from models.schemas import FileRequest, ProcessingResponse, AnalysisRequest, AnalysisResponse, ExportRequest, ExportResponse, JobStatus, TableRowsResponse
 from services.document_processor import process_document_handler
+from services.batch_service import process_batch
 from services.analysis_service import process_analysis_request
 from services.export_service import generate_export
-from utils.temp_files import TEMP_DIR, cleanup_files
-from config.settings import FILE_SIZE_LIMITS, MAX_ROWS_PER_SHEET
+from services.job_service import job_queue, get_job_result_or_raise
+from services.result_cache import result_cache
+from services.model_registry import warm_up, model_status
+from services.table_store import get_table_or_404, get_sheet_rows, get_row_range
+from services.result_exports import result_exports
+from services.export_store import export_store
+from utils.temp_files import TEMP_DIR, cleanup_files, scratch
+from utils.file_responses import content_disposition, ranged_file_response
+from utils.file_utils import close_http_client, download_store, receive_upload
+from utils.worker_pool import admission, shutdown_pools, run_io
+from config.settings import FILE_SIZE_LIMITS, MAX_ROWS_PER_SHEET, CPU_WORKERS, IO_WORKERS, WARMUP_MODELS, BATCH_MAX_FILES
+
+# Startup timings, reported by /health
+startup_times = {"import_time": time.perf_counter() - _import_start}
+
+# Long-running tasks started at startup and cancelled at shutdown
+background_jobs: List[asyncio.Task] = []
 
 app = FastAPI(title="Document Processing API", 
               description="API for OCR, NER, and data analysis of various document types")
@@ -32,7 +53,128 @@ app.add_middleware(
 @app.post("/process", response_model=ProcessingResponse)
 async def process_document(file_request: FileRequest, background_tasks: BackgroundTasks):
     """Process document and extract text and entities."""
-    return await process_document_handler(file_request, background_tasks)
+    async with admission.admit():
+        return await process_document_handler(file_request, background_tasks)
+
+# /process/upload reads its own body, so its form is declared here for the docs
+UPLOAD_FORM_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file", "file_id"],
+                    "properties": {
+                        "file": {"type": "string", "format": "binary"},
+                        "file_id": {"type": "string"},
+                        "file_type": {"type": "string"}
+                    }
+                }
+            }
+        }
+    }
+}
+
+@app.post("/process/upload", response_model=ProcessingResponse, openapi_extra=UPLOAD_FORM_SCHEMA)
+async def process_uploaded_document(request: Request, background_tasks: BackgroundTasks):
+    """
+    Process a document sent as a multipart upload instead of by URL.
+
+    Admission and the scratch quota are checked before the body is read, and
+    the file part streams straight into the download store.
+    """
+    async with admission.admit():
+        scratch.check_quota()
+        fields, upload = await receive_upload(request)
+        try:
+            if upload is None or not fields.get("file_id"):
+                raise HTTPException(status_code=422, detail="Form fields 'file' and 'file_id' are required")
+            file_request = FileRequest(
+                file_id=fields["file_id"],
+                file_url="",
+                file_type=fields.get("file_type") or upload.content_type,
+                file_name=os.path.basename(upload.filename or fields["file_id"])
+            )
+            return await process_document_handler(file_request, background_tasks, upload=upload)
+        finally:
+            # A no-op once processing has moved the file into the store
+            if upload is not None:
+                upload.discard()
+
+@app.post("/process/batch")
+async def process_documents_batch(file_requests: List[FileRequest]):
+    """
+    Process many documents in one request. Streams one ProcessingResponse
+    (or BatchItemError) per line as NDJSON, in the order documents finish.
+    """
+    if not file_requests:
+        raise HTTPException(status_code=400, detail="The batch is empty")
+    if len(file_requests) > BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_FILES} files per batch")
+    return StreamingResponse(process_batch(file_requests), media_type="application/x-ndjson")
+
+# Columnar downloads of processed result tables
+TABLE_FORMATS = {
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+@app.get("/results/{file_id}/table")
+async def download_result_table(file_id: str, format: str = "arrow"):
+    """Download a processed result table as an Arrow IPC stream or a Parquet file."""
+    if format not in TABLE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported table format, use one of: {', '.join(TABLE_FORMATS)}")
+    table = get_table_or_404(file_id)
+    media_type, extension = TABLE_FORMATS[format]
+    content = await run_io(table.to_arrow_ipc if format == "arrow" else table.to_parquet)
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={"Content-Disposition": content_disposition(f"{file_id}.{extension}")}
+    )
+
+@app.get("/results/{file_id}/sheets/{sheet_index}", response_model=TableRowsResponse)
+async def get_result_sheet(file_id: str, sheet_index: int):
+    """Fetch one sheet page of a processed result; /process only returns the first."""
+    return await run_io(get_sheet_rows, file_id, sheet_index)
+
+@app.get("/results/{file_id}/rows", response_model=TableRowsResponse)
+async def get_result_rows(
+    file_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(MAX_ROWS_PER_SHEET, ge=1, le=MAX_ROWS_PER_SHEET),
+    columns: Optional[List[str]] = Query(None),
+    filter: Optional[List[str]] = Query(None)
+):
+    """Fetch a row range of a processed result, optionally projected onto `columns` and filtered by `column:value`."""
+    return await run_io(get_row_range, file_id, offset, limit, columns, filter)
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+@app.get("/results/{file_id}/export.xlsx")
+async def download_result_excel(file_id: str, request: Request):
+    """Download the result table as an Excel workbook, built on first request and cached."""
+    path = await result_exports.get_xlsx(file_id)
+    return ranged_file_response(request, path, XLSX_MEDIA_TYPE, f"{file_id}.xlsx")
+
+@app.post("/jobs", response_model=JobStatus, status_code=202)
+async def submit_job(file_request: FileRequest):
+    """Queue a document for processing and return the job id immediately."""
+    return await job_queue.submit(file_request)
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job_status(job_id: str):
+    """Get the status and stage progress of a processing job."""
+    status = job_queue.get_status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return status
+
+@app.get("/jobs/{job_id}/result", response_model=ProcessingResponse)
+async def get_job_result(job_id: str):
+    """Get the result of a completed processing job."""
+    return get_job_result_or_raise(job_queue, job_id)
 
 @app.post("/analyze", response_model=AnalysisResponse)
 async def analyze_data(analysis_request: AnalysisRequest, background_tasks: BackgroundTasks):
@@ -44,6 +186,24 @@ async def export_analysis(export_request: ExportRequest, background_tasks: Backg
     """Export analysis data to various document formats."""
     return await generate_export(export_request, background_tasks)
 
+# Media types of /export formats, for /exports downloads
+EXPORT_MEDIA_TYPES = {
+    "pdf": "application/pdf",
+    "pptx": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    "xlsx": XLSX_MEDIA_TYPE,
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+
+@app.get("/exports/{export_id}")
+async def download_export(export_id: str, request: Request):
+    """Download a generated export; supports Range requests and ETag revalidation."""
+    path = await run_io(export_store.resolve, export_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Export not found or expired")
+    filename = os.path.basename(path)
+    media_type = EXPORT_MEDIA_TYPES.get(os.path.splitext(filename)[1].lstrip("."), "application/octet-stream")
+    return ranged_file_response(request, path, media_type, filename)
+
 # Root endpoint for health checks - Railway expects this
 @app.get("/")
 def root_health_check():
@@ -53,34 +213,18 @@ def root_health_check():
 # Health check endpoint at /health
 @app.get("/health")
 def health_check():
-    """Health check endpoint."""
-    import pytesseract
-    import spacy
-    
+    """Health check endpoint. Reports model state without loading or importing anything."""
     packages = {"tesseract": "", "spacy": "", "pandas": "", "pandasai": ""}
     
-    try:
-        import pandas
-        packages["pandas"] = pandas.__version__
-    except ImportError:
-        packages["pandas"] = "not installed"
-        
-    try:
-        import pandasai
-        packages["pandasai"] = pandasai.__version__
-    except ImportError:
-        packages["pandasai"] = "not installed"
+    for package in ("pandas", "pandasai"):
+        try:
+            packages[package] = importlib.metadata.version(package)
+        except importlib.metadata.PackageNotFoundError:
+            packages[package] = "not installed"
     
-    try:
-        nlp = spacy.load("en_core_web_sm")
-        packages["spacy"] = nlp.meta['name']
-    except:
-        packages["spacy"] = "failed to load"
-    
-    try:
-        packages["tesseract"] = pytesseract.get_tesseract_version()
-    except:
-        packages["tesseract"] = "failed to load"
+    models = model_status()
+    packages["spacy"] = models["spacy"].get("name", "not loaded")
+    packages["tesseract"] = models["tesseract"].get("version", "not loaded")
     
     system_info = {
         "python_executable": sys.executable,
@@ -93,6 +237,12 @@ def health_check():
     return {
         "status": "healthy", 
         "packages": packages,
+        "models": models,
+        "startup": startup_times,
+        "workers": admission.stats(),
+        "result_cache": result_cache.stats(),
+        "downloads": download_store.stats(),
+        "scratch": scratch.stats(),
         "system_info": system_info
     }
 
@@ -111,13 +261,29 @@ async def startup_event():
     print(f"Temporary directory created at: {TEMP_DIR}")
     print(f"File size limits: {FILE_SIZE_LIMITS}")
     print(f"Max rows per sheet: {MAX_ROWS_PER_SHEET}")
+    print(f"Worker pools: {CPU_WORKERS} CPU processes, {IO_WORKERS} I/O threads")
     print(f"Environment: PORT={os.environ.get('PORT', '(not set)')}")
     print(f"Current directory: {os.getcwd()}")
     print(f"Directory contents: {os.listdir()}")
+    if WARMUP_MODELS:
+        # Load models before the process pool starts so forked workers inherit them
+        warmup_start = time.perf_counter()
+        await run_io(warm_up)
+        startup_times["warmup_time"] = time.perf_counter() - warmup_start
+    await job_queue.start()
+    # Also clears directories left by earlier crashed processes
+    background_jobs.append(asyncio.create_task(scratch.run_sweeper()))
+    startup_times["startup_time"] = time.perf_counter() - _import_start
+    print(f"Startup timings: {startup_times}")
 
 @app.on_event("shutdown")
-def shutdown_event():
+async def shutdown_event():
     """Run on shutdown."""
+    for task in background_jobs:
+        task.cancel()
+    await job_queue.stop()
+    await close_http_client()
+    shutdown_pools()
     print(f"Cleaning up temporary directory: {TEMP_DIR}")
     try:
         shutil.rmtree(TEMP_DIR)
@@ -26,6 +26,15 @@ class DataFrameOutput(BaseModel):
     total_rows: int
     sheet_count: int
 
+class TableRowsResponse(BaseModel):
+    file_id: str
+    headers: List[str]
+    rows: List[List[Any]]
+    offset: int
+    row_count: int
+    total_rows: int  # rows matching the filters, before offset/limit
+    sheet: Optional[str] = None
+
 class ProcessingResponse(BaseModel):
     file_id: str
     full_text: Optional[str] = None
@@ -36,6 +45,12 @@ class ProcessingResponse(BaseModel):
     metadata: Optional[Dict[str, Any]] = None
     temp_files: List[str] = []
 
+class BatchItemError(BaseModel):
+    # NDJSON line of /process/batch for a document that failed
+    file_id: str
+    status_code: int
+    detail: str
+
 # Schemas for data analysis
 class AnalysisRequest(BaseModel):
     request_id: str
@@ -68,3 +83,20 @@ class ExportResponse(BaseModel):
     export_file_path: str
     download_url: str
     metadata: Optional[Dict[str, Any]] = None
+
+# Schemas for asynchronous processing jobs
+class JobProgress(BaseModel):
+    stage: str  # 'queued', 'download', 'render', 'ocr', 'extract', 'ner', 'done'
+    current: Optional[int] = None
+    total: Optional[int] = None
+
+class JobStatus(BaseModel):
+    job_id: str
+    file_id: str
+    status: str  # 'queued', 'running', 'completed', 'failed'
+    progress: Optional[JobProgress] = None
+    error: Optional[str] = None
+    error_status_code: Optional[int] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
@@ -0,0 +1,372 @@
+import io
+import json
+import math
+import os
+import pickle
+import shutil
+import uuid
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import pandas as pd
+
+from models.schemas import DataFrameOutput
+from config.settings import MAX_ROWS_PER_SHEET
+
+def json_rows(df: pd.DataFrame) -> List[List[Any]]:
+    """Rows of a DataFrame as lists, with missing values as None (NaN is not valid JSON)."""
+    if df.isna().values.any():
+        df = df.astype(object).where(df.notna(), None)
+    return df.values.tolist()
+
+# Arrow schema metadata listing the columns stored as pickled cells
+_PICKLED_COLUMNS = b"pickled_columns"
+
+def _encode_frame(df: pd.DataFrame):
+    """
+    Convert a DataFrame to a pyarrow Table without losing any value.
+
+    Typed columns map onto Arrow types directly. Object columns that hold
+    anything but strings (numbers mixed with text, missing cells) are stored
+    as pickled cells, so they read back exactly as they were.
+    """
+    import pyarrow as pa
+    from pandas.api.types import infer_dtype
+
+    pickled = [col for col in df.columns
+               if df[col].dtype == object and infer_dtype(df[col], skipna=False) != "string"]
+    if pickled:
+        df = df.assign(**{col: [pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL) for value in df[col]]
+                          for col in pickled})
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[_PICKLED_COLUMNS] = json.dumps(pickled).encode()
+    return table.replace_schema_metadata(metadata)
+
+def _decode_frame(table) -> pd.DataFrame:
+    """Inverse of `_encode_frame`."""
+    df = table.to_pandas()
+    for col in json.loads((table.schema.metadata or {}).get(_PICKLED_COLUMNS, b"[]")):
+        df[col] = pd.Series([pickle.loads(value) for value in df[col]], index=df.index, dtype=object)
+    return df
+
+# Prefix of a serialized PagedTable, which is stored by reference to its pages
+_PAGED_PREFIX = b"paged:"
+
+def _filter_mask(df: pd.DataFrame, filters: Dict[str, str]) -> pd.Series:
+    # Cells compare as strings; missing cells compare as "", so `column:`
+    # matches the blanks (they are null in the JSON rows)
+    mask = pd.Series(True, index=df.index)
+    for column, value in filters.items():
+        values = df[column]
+        mask &= values.astype(str).where(values.notna(), "") == value
+    return mask
+
+class TabularData:
+    """
+    Columnar table passed between pipeline stages.
+
+    Wraps a pandas DataFrame, so columns stay NumPy-backed and no per-cell
+    Python lists are built until the table is converted to a
+    DataFrameOutput at the API boundary. Sheets are row ranges of
+    MAX_ROWS_PER_SHEET rows, computed on demand.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        # Column names must be strings for JSON, Arrow and Parquet. Only copy
+        # when something needs fixing; the frame may be shared with a cache.
+        if not all(isinstance(col, str) for col in df.columns):
+            df = df.rename(columns=str)
+        if not (isinstance(df.index, pd.RangeIndex) and df.index.start == 0 and df.index.step == 1):
+            df = df.reset_index(drop=True)
+        self.df = df
+
+    @property
+    def headers(self) -> List[str]:
+        return list(self.df.columns)
+
+    @property
+    def total_rows(self) -> int:
+        return len(self.df)
+
+    @property
+    def sheet_count(self) -> int:
+        return math.ceil(self.total_rows / MAX_ROWS_PER_SHEET)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.df.memory_usage(deep=True).sum())
+
+    def available(self) -> bool:
+        """Whether the rows can still be read; see PagedTable."""
+        return True
+
+    def iter_sheets(self) -> Iterator[Tuple[str, pd.DataFrame]]:
+        """Yield (sheet name, rows) for each sheet page."""
+        for sheet_idx in range(self.sheet_count):
+            start_idx = sheet_idx * MAX_ROWS_PER_SHEET
+            yield f"Sheet{sheet_idx + 1}", self.df.iloc[start_idx:start_idx + MAX_ROWS_PER_SHEET]
+
+    def sheet(self, sheet_index: int) -> Tuple[str, pd.DataFrame]:
+        """Return (sheet name, rows) of one sheet page; raises IndexError when out of range."""
+        if not 0 <= sheet_index < self.sheet_count:
+            raise IndexError(sheet_index)
+        start_idx = sheet_index * MAX_ROWS_PER_SHEET
+        return f"Sheet{sheet_index + 1}", self.df.iloc[start_idx:start_idx + MAX_ROWS_PER_SHEET]
+
+    def select(
+        self,
+        offset: int = 0,
+        limit: int = MAX_ROWS_PER_SHEET,
+        columns: Optional[List[str]] = None,
+        filters: Optional[Dict[str, str]] = None
+    ) -> Tuple[pd.DataFrame, int]:
+        """
+        Return a row range, optionally projected onto `columns` and limited to
+        rows whose cells equal the `filters` values (compared as strings),
+        plus the number of rows that matched before slicing. Unknown columns
+        raise KeyError.
+        """
+        df = self.df
+        if filters:
+            df = df[_filter_mask(df, filters)]
+        if columns:
+            df = df[columns]
+        return df.iloc[offset:offset + limit], len(df)
+
+    def to_output(self, max_sheets: Optional[int] = None) -> DataFrameOutput:
+        """
+        Convert to the paginated JSON schema returned by the API. Only the
+        first `max_sheets` sheet pages are included when it is set; headers
+        and counts always describe the whole table.
+        """
+        sheets = []
+        for name, sheet_df in self.iter_sheets():
+            if max_sheets is not None and len(sheets) >= max_sheets:
+                break
+            sheets.append({
+                "name": name,
+                "rows": json_rows(sheet_df),
+                "row_count": len(sheet_df),
+                "column_count": len(self.headers)
+            })
+
+        return DataFrameOutput(
+            headers=self.headers,
+            sheets=sheets,
+            total_rows=self.total_rows,
+            sheet_count=self.sheet_count
+        )
+
+    def to_arrow(self):
+        """
+        Convert to a pyarrow Table for downloads, falling back to strings for
+        mixed-type columns. Use `serialize` where values must survive exactly.
+        """
+        import pyarrow as pa
+
+        try:
+            return pa.Table.from_pandas(self.df, preserve_index=False)
+        except (pa.ArrowTypeError, pa.ArrowInvalid):
+            # Spreadsheet columns can mix numbers and text, which Arrow cannot type
+            df = self.df.copy()
+            for col in df.columns:
+                if df[col].dtype == object:
+                    df[col] = df[col].map(lambda value: None if pd.isna(value) else str(value))
+            return pa.Table.from_pandas(df, preserve_index=False)
+
+    def to_arrow_ipc(self) -> bytes:
+        """Serialize as an Arrow IPC stream."""
+        import pyarrow as pa
+
+        table = self.to_arrow()
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    def to_parquet(self) -> bytes:
+        """Serialize as a Parquet file."""
+        import pyarrow.parquet as pq
+
+        buffer = io.BytesIO()
+        pq.write_table(self.to_arrow(), buffer)
+        return buffer.getvalue()
+
+    def serialize(self) -> bytes:
+        """Serialize losslessly as an Arrow IPC stream, for caches; see `deserialize`."""
+        import pyarrow as pa
+
+        table = _encode_frame(self.df)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    @classmethod
+    def deserialize(cls, data: bytes) -> Optional["TabularData"]:
+        """Read a serialized table back; None if it was a PagedTable whose pages are gone."""
+        import pyarrow as pa
+
+        if data.startswith(_PAGED_PREFIX):
+            return PagedTable.open(data[len(_PAGED_PREFIX):].decode())
+        return cls(_decode_frame(pa.ipc.open_stream(data).read_all()))
+
+class PagedTable(TabularData):
+    """
+    Table stored on disk as one Parquet file per sheet page, written a page
+    at a time by PagedTableWriter.
+
+    Pages are only read when a caller asks for them, so serving a sheet,
+    selecting rows or exporting the table holds at most a page or two of
+    rows in memory. Pages are stored losslessly (see `_encode_frame`).
+    """
+
+    def __init__(self, path: str, headers: List[str], total_rows: int):
+        self.path = path
+        self._headers = headers
+        self._total_rows = total_rows
+
+    @classmethod
+    def open(cls, path: str) -> Optional["PagedTable"]:
+        """Open a table written by PagedTableWriter; None if it does not exist."""
+        try:
+            with open(os.path.join(path, "table.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cls(path, meta["headers"], meta["total_rows"])
+
+    @property
+    def headers(self) -> List[str]:
+        return list(self._headers)
+
+    @property
+    def total_rows(self) -> int:
+        return self._total_rows
+
+    @property
+    def nbytes(self) -> int:
+        # The rows are on disk; only the metadata is held in memory
+        return 0
+
+    def available(self) -> bool:
+        return os.path.isdir(self.path)
+
+    def _read_page(self, sheet_index: int) -> pd.DataFrame:
+        import pyarrow.parquet as pq
+
+        df = _decode_frame(pq.read_table(_page_path(self.path, sheet_index)))
+        # Row labels as in the whole table, like TabularData.iter_sheets
+        df.index = pd.RangeIndex(sheet_index * MAX_ROWS_PER_SHEET, sheet_index * MAX_ROWS_PER_SHEET + len(df))
+        return df
+
+    def iter_sheets(self) -> Iterator[Tuple[str, pd.DataFrame]]:
+        for sheet_idx in range(self.sheet_count):
+            yield f"Sheet{sheet_idx + 1}", self._read_page(sheet_idx)
+
+    def sheet(self, sheet_index: int) -> Tuple[str, pd.DataFrame]:
+        if not 0 <= sheet_index < self.sheet_count:
+            raise IndexError(sheet_index)
+        return f"Sheet{sheet_index + 1}", self._read_page(sheet_index)
+
+    def select(
+        self,
+        offset: int = 0,
+        limit: int = MAX_ROWS_PER_SHEET,
+        columns: Optional[List[str]] = None,
+        filters: Optional[Dict[str, str]] = None
+    ) -> Tuple[pd.DataFrame, int]:
+        """Like TabularData.select, reading one page at a time."""
+        if not filters:
+            # Every row matches, so only the pages overlapping the range are read
+            first_page = offset // MAX_ROWS_PER_SHEET
+            last_page = min(math.ceil((offset + limit) / MAX_ROWS_PER_SHEET), self.sheet_count)
+            pages = (self._read_page(sheet_idx) for sheet_idx in range(first_page, last_page))
+            matched = first_page * MAX_ROWS_PER_SHEET
+        else:
+            pages = (page for _, page in self.iter_sheets())
+            matched = 0
+
+        parts = []
+        for page in pages:
+            if filters:
+                page = page[_filter_mask(page, filters)]
+            if columns:
+                page = page[columns]
+            # The part of this page inside the [offset, offset + limit) window of matches
+            start = max(offset - matched, 0)
+            stop = max(offset + limit - matched, 0)
+            if start < min(stop, len(page)):
+                parts.append(page.iloc[start:stop])
+            matched += len(page)
+        if not filters:
+            matched = self.total_rows
+
+        if not parts:
+            return pd.DataFrame(columns=columns or self.headers), matched
+        return pd.concat(parts) if len(parts) > 1 else parts[0], matched
+
+    def to_arrow(self):
+        # Only for whole-table downloads: pages can differ in dtype, so they
+        # are joined into one frame first
+        if not self.total_rows:
+            return TabularData(pd.DataFrame(columns=self.headers)).to_arrow()
+        return TabularData(pd.concat([page for _, page in self.iter_sheets()], ignore_index=True)).to_arrow()
+
+    def serialize(self) -> bytes:
+        # By reference: the pages stay where they are
+        return _PAGED_PREFIX + self.path.encode()
+
+def _page_path(path: str, sheet_index: int) -> str:
+    return os.path.join(path, f"page-{sheet_index:06d}.parquet")
+
+class PagedTableWriter:
+    """
+    Write a PagedTable page by page. Pages go to a temporary directory that
+    `close` renames to `path`, so readers never see a partial table; if
+    another writer published the same path first, its table is kept.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.headers: Optional[List[str]] = None
+        self.total_rows = 0
+        self._pages = 0
+        self._tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(self._tmp_path)
+
+    def write(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Write the next page of at most MAX_ROWS_PER_SHEET rows; only the last
+        page may be shorter. Returns the page with its column names and row
+        labels as the table will serve them.
+        """
+        import pyarrow.parquet as pq
+
+        if len(df) > MAX_ROWS_PER_SHEET or self.total_rows % MAX_ROWS_PER_SHEET:
+            raise ValueError("Only the last page of a table may be shorter than MAX_ROWS_PER_SHEET")
+        df = TabularData(df).df
+        if self.headers is None:
+            self.headers = list(df.columns)
+        if len(df):
+            pq.write_table(_encode_frame(df), _page_path(self._tmp_path, self._pages))
+            self._pages += 1
+        df = df.set_axis(pd.RangeIndex(self.total_rows, self.total_rows + len(df)), axis=0)
+        self.total_rows += len(df)
+        return df
+
+    def close(self) -> PagedTable:
+        meta = {"headers": self.headers or [], "total_rows": self.total_rows}
+        with open(os.path.join(self._tmp_path, "table.json"), "w") as f:
+            json.dump(meta, f)
+        try:
+            os.rename(self._tmp_path, self.path)
+        except OSError:
+            shutil.rmtree(self._tmp_path, ignore_errors=True)
+            table = PagedTable.open(self.path)
+            if table is None:
+                raise
+            return table
+        return PagedTable(self.path, meta["headers"], meta["total_rows"])
+
+    def abort(self) -> None:
+        shutil.rmtree(self._tmp_path, ignore_errors=True)
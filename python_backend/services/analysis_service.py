@@ -1,35 +1,41 @@
 
-import os
 import time
 from typing import Dict, Any, Optional
 from fastapi import BackgroundTasks, HTTPException
 from models.schemas import AnalysisRequest, AnalysisResponse
-from utils.file_utils import download_file, check_file_size
-from utils.temp_files import cleanup_files
+from utils.file_utils import download_file, release_download
+from utils.temp_files import cleanup_files, scratch
 from utils.pandas_ai_utils import analyze_data_with_pandasai, get_data_preview
 
+ANALYSIS_MAX_BYTES = 50 * 1024 * 1024
+
 async def process_analysis_request(analysis_request: AnalysisRequest, background_tasks: BackgroundTasks) -> AnalysisResponse:
     """Process data analysis request using PandasAI."""
     start_time = time.time()
     temp_files = []
+    file_path = None
     
     try:
-        # Download file
-        file_path = download_file(analysis_request.file_url, analysis_request.file_name)
-        temp_files.append(file_path)
+        scratch.check_quota()
+        # Files this request writes (charts) go in its own directory
+        job_dir = scratch.job_dir()
+        temp_files.append(job_dir)
+        
+        # Download file, aborting once it passes the 50MB analysis limit. The
+        # digest computed during the download lets the preview and the
+        # analysis share one parsed DataFrame.
+        file_path, digest = await download_file(analysis_request.file_url, analysis_request.file_name, ANALYSIS_MAX_BYTES)
         
-        # Check file size (limit to 50MB for analysis)
-        if os.path.getsize(file_path) > 50 * 1024 * 1024:  # 50MB
-            raise HTTPException(status_code=400, detail="File too large for analysis (max 50MB)")
-            
         # Get data preview
-        preview = get_data_preview(file_path)
+        preview = get_data_preview(file_path, digest=digest)
         
         # Run the analysis
         result = analyze_data_with_pandasai(
             file_path=file_path,
             prompt=analysis_request.prompt,
-            api_key=analysis_request.api_key
+            api_key=analysis_request.api_key,
+            digest=digest,
+            output_dir=job_dir
         )
         
         if "error" in result:
@@ -39,7 +45,6 @@ async def process_analysis_request(analysis_request: AnalysisRequest, background
         visualization_path = None
         if result.get("visualization"):
             visualization_path = result["visualization"]
-            temp_files.append(visualization_path)
             
         # Prepare metadata
         metadata = {
@@ -48,8 +53,9 @@ async def process_analysis_request(analysis_request: AnalysisRequest, background
             "processing_timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
         }
         
-        # Add cleanup task
+        # Add cleanup tasks
         background_tasks.add_task(cleanup_files, temp_files)
+        background_tasks.add_task(release_download, file_path)
         
         return AnalysisResponse(
             request_id=analysis_request.request_id,
@@ -61,7 +67,16 @@ async def process_analysis_request(analysis_request: AnalysisRequest, background
             temp_files=temp_files
         )
         
+    except HTTPException:
+        # Quota, size limit and analysis errors keep their status code
+        if file_path is not None:
+            release_download(file_path)
+        background_tasks.add_task(cleanup_files, temp_files)
+        raise
     except Exception as e:
-        # Clean up files
+        # Clean up files; the download is released now since background
+        # tasks do not run when the request fails
+        if file_path is not None:
+            release_download(file_path)
         background_tasks.add_task(cleanup_files, temp_files)
         raise HTTPException(status_code=500, detail=str(e))
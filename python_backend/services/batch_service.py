@@ -0,0 +1,57 @@
+"""
+Batch processing: many documents per request, with NER shared between them.
+"""
+import asyncio
+from typing import AsyncIterator, List, Optional
+from fastapi import BackgroundTasks, HTTPException
+
+from models.schemas import FileRequest, BatchItemError
+from services.document_processor import process_document_handler
+from services.ner_batcher import NerBatcher
+from utils.worker_pool import admission
+from config.settings import BATCH_CONCURRENCY
+
+# Documents from all batch requests in flight at once
+_batch_slots: Optional[asyncio.Semaphore] = None
+
+async def _process_one(file_request: FileRequest, ner: NerBatcher) -> str:
+    """Process one document of a batch and return its NDJSON line."""
+    # Each document cleans up as soon as it is done, not when the whole batch is
+    background_tasks = BackgroundTasks()
+    try:
+        response = await process_document_handler(file_request, background_tasks, ner=ner)
+        line = response.json()
+    except HTTPException as e:
+        line = BatchItemError(file_id=file_request.file_id, status_code=e.status_code, detail=str(e.detail)).json()
+    await background_tasks()
+    return line
+
+async def process_batch(file_requests: List[FileRequest]) -> AsyncIterator[str]:
+    """
+    Process a batch of documents and yield one NDJSON line per document, in
+    the order they finish.
+
+    At most BATCH_CONCURRENCY documents from all batches are in flight at
+    once, and like jobs each one also holds a /process admission slot while
+    it runs, waiting for one rather than failing with 503. Their NER,
+    spreadsheets included, runs through a shared NerBatcher. A failed
+    document yields a `BatchItemError` line instead of failing the batch.
+    """
+    global _batch_slots
+    if _batch_slots is None:
+        _batch_slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+    ner = NerBatcher()
+
+    async def run(file_request: FileRequest) -> str:
+        async with _batch_slots:
+            async with admission.admit(reject=False):
+                return await _process_one(file_request, ner)
+
+    tasks = [asyncio.ensure_future(run(file_request)) for file_request in file_requests]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task + "\n"
+    finally:
+        # The client went away: stop the documents that have not finished
+        for task in tasks:
+            task.cancel()
@@ -1,111 +1,81 @@
 
-import math
 import pandas as pd
-from typing import List, Dict, Any, Optional, Tuple
-from models.schemas import EntityModel, DataFrameOutput
-from config.settings import MAX_ROWS_PER_SHEET
+from typing import List, Dict, Optional, Tuple
+from models.schemas import EntityModel
+from models.tabular import TabularData
+from services.ner_service import extract_entities_batch, merge_page_entities
+from utils.dataframe_loader import spreadsheet_cache
+from utils.excel_writer import dataframe_rows, write_xlsx
 
-def create_dataframe_from_entities(entities: List[EntityModel]) -> DataFrameOutput:
-    """Create a pandas DataFrame from extracted entities with pagination."""
-    # Group entities by type
-    entity_groups = {}
+ENTITY_COLUMN_DTYPE = "string[pyarrow]"
+
+def group_entities(entities: List[EntityModel]) -> Dict[str, List[str]]:
+    """Entity values by type, types and values in order of first appearance."""
+    entity_groups: Dict[str, List[str]] = {}
     for entity in entities:
-        if entity.type not in entity_groups:
-            entity_groups[entity.type] = []
-        entity_groups[entity.type].append(entity.value)
-    
-    # Create headers
-    headers = list(entity_groups.keys())
-    
-    # Find the maximum number of entities in any group
-    max_entities = max([len(group) for group in entity_groups.values()], default=0)
-    
-    # Calculate number of sheets needed
-    sheet_count = math.ceil(max_entities / MAX_ROWS_PER_SHEET)
-    sheets = []
-    
-    for sheet_idx in range(sheet_count):
-        start_idx = sheet_idx * MAX_ROWS_PER_SHEET
-        end_idx = min((sheet_idx + 1) * MAX_ROWS_PER_SHEET, max_entities)
-        
-        sheet_rows = []
-        for i in range(start_idx, end_idx):
-            row = []
-            for entity_type in headers:
-                if i < len(entity_groups[entity_type]):
-                    row.append(entity_groups[entity_type][i])
-                else:
-                    row.append("")
-            sheet_rows.append(row)
-        
-        sheets.append({
-            "name": f"Sheet{sheet_idx + 1}",
-            "rows": sheet_rows,
-            "row_count": len(sheet_rows),
-            "column_count": len(headers)
-        })
-    
-    return DataFrameOutput(
-        headers=headers,
-        sheets=sheets,
-        total_rows=max_entities,
-        sheet_count=sheet_count
-    )
+        values = entity_groups.get(entity.type)
+        if values is None:
+            values = entity_groups[entity.type] = []
+        values.append(entity.value)
+    return entity_groups
+
+def summarize_entities(entities: List[EntityModel]) -> Dict[str, List[str]]:
+    """Distinct entity values by type, keeping first-seen order."""
+    # dict.fromkeys de-dups in linear time and preserves insertion order
+    return {entity_type: list(dict.fromkeys(values)) for entity_type, values in group_entities(entities).items()}
+
+def create_dataframe_from_entities(entities: List[EntityModel]) -> TabularData:
+    """Create a table from extracted entities, one column per entity type."""
+    entity_groups = group_entities(entities)
+    max_entities = max((len(values) for values in entity_groups.values()), default=0)
+
+    # Typed string columns keep the values in Arrow buffers rather than one
+    # Python object per cell; shorter columns are padded with ""
+    columns = {
+        entity_type: pd.array(values + [""] * (max_entities - len(values)), dtype=ENTITY_COLUMN_DTYPE)
+        for entity_type, values in entity_groups.items()
+    }
+    return TabularData(pd.DataFrame(columns))
+
+def process_spreadsheet(
+    file_path: str,
+    digest: str,
+    extract_entities: bool = True
+) -> Tuple[List[str], Optional[List[EntityModel]], Optional[TabularData]]:
+    """
+    Process Excel or CSV files one page at a time.
 
-def process_spreadsheet(file_path: str) -> Tuple[str, Optional[DataFrameOutput]]:
-    """Process Excel or CSV files with pagination."""
+    Pages of MAX_ROWS_PER_SHEET rows stream from the parser into the
+    spreadsheet cache on disk (see utils.dataframe_loader), and each page is
+    turned into text and run through NER as it arrives, so only one page of
+    rows is in memory at once. Returns the page texts (the response carries
+    the full text), the entities and the stored table. With
+    `extract_entities=False` the entities are None and the caller runs NER
+    on the page texts, e.g. through a NerBatcher.
+    """
     try:
-        if file_path.endswith('.csv'):
-            df = pd.read_csv(file_path)
-        else:  # Excel files
-            df = pd.read_excel(file_path)
+        page_texts = []
+        entities_per_page = []
+        for page_df in spreadsheet_cache.iter_pages(file_path, digest):
+            page_text = page_df.to_string() + "\n"
+            page_texts.append(page_text)
+            if extract_entities:
+                entities_per_page.append(extract_entities_batch([page_text])[0])
         
-        # Convert to text for entity extraction
-        text = df.to_string()
-        
-        # Get headers
-        headers = df.columns.tolist()
-        
-        # Calculate number of sheets needed
-        total_rows = len(df)
-        sheet_count = math.ceil(total_rows / MAX_ROWS_PER_SHEET)
-        
-        # Create sheets
-        sheets = []
-        for sheet_idx in range(sheet_count):
-            start_idx = sheet_idx * MAX_ROWS_PER_SHEET
-            end_idx = min((sheet_idx + 1) * MAX_ROWS_PER_SHEET, total_rows)
-            
-            sheet_df = df.iloc[start_idx:end_idx]
-            
-            sheets.append({
-                "name": f"Sheet{sheet_idx + 1}",
-                "rows": sheet_df.values.tolist(),
-                "row_count": len(sheet_df),
-                "column_count": len(headers)
-            })
-        
-        data_frame = DataFrameOutput(
-            headers=headers,
-            sheets=sheets,
-            total_rows=total_rows,
-            sheet_count=sheet_count
-        )
-        
-        return text, data_frame
+        entities = merge_page_entities(page_texts, entities_per_page) if extract_entities else None
+        return page_texts, entities, spreadsheet_cache.open(digest)
     except Exception as e:
         print(f"Error processing spreadsheet: {str(e)}")
-        return "", None
+        return [], [], None
 
-def export_to_excel(data_frame: DataFrameOutput, output_path: str) -> str:
-    """Export data to Excel with multiple sheets if needed."""
+def export_to_excel(table: TabularData, output_path: str) -> str:
+    """Export data to Excel with multiple sheets if needed, streaming rows sheet by sheet."""
     try:
-        with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-            for sheet in data_frame.sheets:
-                # Create DataFrame for this sheet
-                sheet_df = pd.DataFrame(sheet["rows"], columns=data_frame.headers)
-                # Write to Excel
-                sheet_df.to_excel(writer, sheet_name=sheet["name"], index=False)
+        sheets = (
+            (sheet_name, table.headers, dataframe_rows(sheet_df))
+            for sheet_name, sheet_df in table.iter_sheets()
+        )
+        write_xlsx(output_path, sheets)
         return output_path
     except Exception as e:
         print(f"Error exporting to Excel: {str(e)}")
@@ -1,95 +1,195 @@
 
-import os
 import time
+import asyncio
 from fastapi import BackgroundTasks, HTTPException
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Callable, Optional
 
 from models.schemas import FileRequest, ProcessingResponse
-from utils.file_utils import check_file_size, download_file
-from utils.temp_files import cleanup_files
-from services.ocr_service import extract_text_from_pdf, process_image_with_ocr
-from services.ner_service import extract_entities_with_ner
-from services.dataframe_service import create_dataframe_from_entities, process_spreadsheet, export_to_excel
+from utils.file_utils import ReceivedUpload, download_file, save_upload, file_size_limit, release_download
+from utils.temp_files import cleanup_files, scratch
+from utils.worker_pool import run_cpu, run_io
+from services.ocr_service import extract_text_from_pdf, ocr_pdf_page, process_image_with_ocr
+from services.ner_service import extract_entities_with_ner, extract_entities_from_pages
+from services.ner_batcher import NerBatcher
+from services.dataframe_service import create_dataframe_from_entities, summarize_entities, process_spreadsheet
 from services.docx_service import process_docx
 from services.language_service import detect_language
+from services.result_cache import result_cache, make_cache_key
+from services.table_store import table_store
+from config.settings import OCR_PAGE_CONCURRENCY, INLINE_SHEETS
 
-async def process_document_handler(file_request: FileRequest, background_tasks: BackgroundTasks) -> ProcessingResponse:
-    """Process document and extract text and entities."""
+def read_text_file(file_path: str) -> str:
+    """Read a plain text file."""
+    with open(file_path, 'r', errors='ignore') as f:
+        return f.read()
+
+async def ocr_pdf_pages(file_path: str, page_nums: List[int], progress: Callable[..., None]) -> List[str]:
+    """
+    Render and OCR PDF pages in parallel on the process pool.
+
+    At most OCR_PAGE_CONCURRENCY pages are in flight at once. Pages are rendered
+    in memory inside the worker, and texts are returned in the order of `page_nums`.
+    """
+    semaphore = asyncio.Semaphore(OCR_PAGE_CONCURRENCY)
+    done = 0
+
+    async def ocr_page(page_num: int) -> str:
+        nonlocal done
+        async with semaphore:
+            result = await run_cpu(ocr_pdf_page, file_path, page_num)
+        done += 1
+        progress("ocr", done, len(page_nums))
+        return result
+
+    return list(await asyncio.gather(*(ocr_page(page_num) for page_num in page_nums)))
+
+def _cache_metadata(hit: bool) -> Dict[str, Any]:
+    return {
+        "cache_hit": hit,
+        "cache_hits": result_cache.hits,
+        "cache_misses": result_cache.misses
+    }
+
+def _release_source(file_path: Optional[str]) -> None:
+    # Released right away rather than as a background task: FastAPI does not
+    # run background tasks when the handler raises, and a leaked reference
+    # would keep the shared download on disk
+    if file_path is not None:
+        release_download(file_path)
+
+def _excel_export_url(file_id: str) -> str:
+    return f"/results/{file_id}/export.xlsx"
+
+def _no_progress(stage: str, current: Optional[int] = None, total: Optional[int] = None) -> None:
+    pass
+
+async def process_document_handler(
+    file_request: FileRequest,
+    background_tasks: BackgroundTasks,
+    progress: Optional[Callable[..., None]] = None,
+    upload: Optional[ReceivedUpload] = None,
+    ner: Optional[NerBatcher] = None
+) -> ProcessingResponse:
+    """Process document and extract text and entities.
+
+    Blocking stages are kept off the event loop: downloads and file reads run
+    in the I/O thread pool, OCR/NER/pandas work runs in the process pool.
+    `progress(stage, current, total)` is called as each stage starts.
+    When `upload` is given its bytes are processed instead of downloading
+    `file_request.file_url`. With `ner`, entity extraction is shared with
+    the other documents using the same batcher.
+    """
+    progress = progress or _no_progress
     start_time = time.time()
     temp_files = []
+    file_path = None
     
     try:
-        # Download file
-        file_path = download_file(file_request.file_url, file_request.file_name)
-        temp_files.append(file_path)
+        # Back off while scratch space is over quota, before writing anything
+        scratch.check_quota()
+        size_limit = file_size_limit(file_request.file_type)
+        if size_limit is None:
+            raise HTTPException(status_code=400, detail="Unsupported file type")
         
-        # Check file size
-        if not check_file_size(file_path, file_request.file_type):
-            raise HTTPException(status_code=400, detail=f"File exceeds size limit for {file_request.file_type}")
+        progress("download")
+        # Download file; the size limit is enforced while the bytes arrive,
+        # and the content hash is computed as they are written
+        if upload is not None:
+            file_path, file_digest = save_upload(upload, file_request.file_name, size_limit)
+        else:
+            file_path, file_digest = await download_file(file_request.file_url, file_request.file_name, size_limit)
+        
+        # Serve repeat uploads of the same bytes from the result cache
+        cache_key = make_cache_key(file_digest, file_request.file_type)
+        cached = await run_io(result_cache.get, cache_key)
+        if cached is not None:
+            cached_response, cached_table = cached
+            if cached_table is not None:
+                table_store.put(file_request.file_id, cached_table, cache_key)
+            background_tasks.add_task(release_download, file_path)
+            background_tasks.add_task(cleanup_files, temp_files)
+            metadata = dict(cached_response.metadata or {})
+            metadata.update(_cache_metadata(hit=True))
+            if metadata.get("has_excel_export"):
+                metadata["excel_export_url"] = _excel_export_url(file_request.file_id)
+            metadata["processing_time"] = time.time() - start_time
+            metadata["processing_timestamp"] = time.strftime("%Y-%m-%d %H:%M:%S")
+            return cached_response.copy(update={
+                "file_id": file_request.file_id,
+                "metadata": metadata,
+                "temp_files": temp_files
+            })
         
         # Initialize variables
         text = ""
-        data_frame = None
+        table = None
+        page_texts = None
+        entities = None
+        ocr_pages = []
         
         # Process based on file type
         if file_request.file_type in ["application/pdf"]:
             # PDF processing
-            pdf_text, images = extract_text_from_pdf(file_path)
-            temp_files.extend(images)
+            progress("render")
+            page_texts, ocr_pages = await run_cpu(extract_text_from_pdf, file_path)
             
-            # If PDF has text, use it; otherwise, use OCR on the images
-            if pdf_text.strip():
-                text = pdf_text
-            else:
-                for img_path in images:
-                    text += process_image_with_ocr(img_path)
+            # Use the text layer where there is one; only render and OCR image-only pages
+            if ocr_pages:
+                ocr_texts = await ocr_pdf_pages(file_path, ocr_pages, progress)
+                for page_num, page_text in zip(ocr_pages, ocr_texts):
+                    page_texts[page_num] = page_text
+            text = "".join(page_texts)
                     
         elif file_request.file_type in ["image/png", "image/jpeg", "image/tiff"]:
             # Image processing with OCR
-            text = process_image_with_ocr(file_path)
+            progress("ocr", 1, 1)
+            text = await run_cpu(process_image_with_ocr, file_path)
             
         elif file_request.file_type in ["text/csv", "application/vnd.ms-excel", 
                                       "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"]:
             # Spreadsheet processing
-            sheet_text, data_frame = process_spreadsheet(file_path)
-            text = sheet_text
+            progress("extract")
+            # Entities are extracted page by page while the file is read,
+            # unless they go through the shared batcher below
+            page_texts, entities, table = await run_cpu(process_spreadsheet, file_path, file_digest, ner is None)
+            text = "".join(page_texts)
             
         elif file_request.file_type == "text/plain":
             # Plain text processing
-            with open(file_path, 'r', errors='ignore') as f:
-                text = f.read()
+            progress("extract")
+            text = await run_io(read_text_file, file_path)
                 
         elif file_request.file_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
             # Word document processing
-            text = process_docx(file_path)
+            progress("extract")
+            text = await run_cpu(process_docx, file_path)
             
         else:
             raise HTTPException(status_code=400, detail="Unsupported file type")
         
-        # Extract entities
-        entities = extract_entities_with_ner(text)
+        # Extract entities (spreadsheets without a batcher already did, page by page)
+        if entities is None:
+            progress("ner")
+            if ner is not None:
+                if page_texts is not None:
+                    entities = await ner.extract_entities_from_pages(page_texts)
+                else:
+                    entities = await ner.extract_entities_with_ner(text)
+            elif page_texts is not None:
+                entities = await run_cpu(extract_entities_from_pages, page_texts)
+            else:
+                entities = await run_cpu(extract_entities_with_ner, text)
         
         # Create entities summary
-        entities_summary = {}
-        for entity in entities:
-            if entity.type not in entities_summary:
-                entities_summary[entity.type] = []
-            if entity.value not in entities_summary[entity.type]:  # Avoid duplicates
-                entities_summary[entity.type].append(entity.value)
+        entities_summary = summarize_entities(entities)
         
-        # Create DataFrame if not already created
-        if data_frame is None:
-            data_frame = create_dataframe_from_entities(entities)
+        # Create the result table if not already created
+        if table is None:
+            table = await run_cpu(create_dataframe_from_entities, entities)
+        table_store.put(file_request.file_id, table, cache_key)
         
         # Detect language
-        detected_language = detect_language(text)
-        
-        # Create Excel export if data_frame exists
-        excel_output = None
-        if data_frame and data_frame.total_rows > 0:
-            excel_output = f"{file_path}_export.xlsx"
-            export_to_excel(data_frame, excel_output)
-            temp_files.append(excel_output)
+        detected_language = await run_cpu(detect_language, text)
         
         # Processing metadata
         metadata = {
@@ -97,15 +197,26 @@ async def process_document_handler(file_request: FileRequest, background_tasks:
             "character_count": len(text),
             "entity_count": len(entities),
             "processing_timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-            "has_excel_export": excel_output is not None,
-            "sheet_count": data_frame.sheet_count if data_frame else 0,
-            "total_rows": data_frame.total_rows if data_frame else 0
+            # Built on first download from the stored table, see result_exports
+            "has_excel_export": table.total_rows > 0,
+            "sheet_count": table.sheet_count,
+            "total_rows": table.total_rows
         }
+        if metadata["has_excel_export"]:
+            metadata["excel_export_url"] = _excel_export_url(file_request.file_id)
+        if file_request.file_type == "application/pdf":
+            metadata["page_count"] = len(page_texts)
+            metadata["ocr_page_count"] = len(ocr_pages)
+        metadata.update(_cache_metadata(hit=False))
         
         # Background task to clean up files after processing
         background_tasks.add_task(cleanup_files, temp_files)
         
-        return ProcessingResponse(
+        # Per-cell Python values are only built here, at the API boundary
+        # Only the first pages go inline; the rest are served from table_store
+        data_frame = await run_io(table.to_output, INLINE_SHEETS)
+        
+        response = ProcessingResponse(
             file_id=file_request.file_id,
             full_text=text,
             detected_language=detected_language,
@@ -115,8 +226,21 @@ async def process_document_handler(file_request: FileRequest, background_tasks:
             metadata=metadata,
             temp_files=temp_files
         )
+        await run_io(result_cache.put, cache_key, response, table)
+        # Added last, so an exception above can never release the download twice
+        background_tasks.add_task(release_download, file_path)
+        return response
         
+    except HTTPException:
+        _release_source(file_path)
+        background_tasks.add_task(cleanup_files, temp_files)
+        raise
+    except asyncio.CancelledError:
+        # A batch request whose client went away
+        _release_source(file_path)
+        raise
     except Exception as e:
         # Clean up any temporary files
+        _release_source(file_path)
         background_tasks.add_task(cleanup_files, temp_files)
         raise HTTPException(status_code=500, detail=str(e))
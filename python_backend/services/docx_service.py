@@ -1,9 +1,9 @@
 
-from docx import Document
-
 def process_docx(file_path: str) -> str:
     """Process Word documents."""
     try:
+        from docx import Document
+        
         doc = Document(file_path)
         text = "\n".join([para.text for para in doc.paragraphs])
         return text
@@ -0,0 +1,29 @@
+import re
+from typing import Iterator, Tuple
+
+# Regex patterns for common data types, combined into one alternation so the
+# text is scanned once. Order matters: where matches start at the same
+# position, the earlier pattern wins. Inner groups must stay non-capturing so
+# match.lastgroup names the entity type.
+ENTITY_PATTERNS = {
+    "EMAIL": r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b',
+    "MONEY": r'\$\s*\d+(?:\.\d{2})?',
+    "DATE": r'\b\d{1,2}[/\-.]\d{1,2}[/\-.]\d{2,4}\b',
+    "PHONE": r'\b(?:\+\d{1,2}\s?)?\(?\d{3}\)?[\s.-]?\d{3}[\s.-]?\d{4}\b',
+    # A house number, up to eight words, then a street suffix. Words and
+    # separators use disjoint character classes and the repetition is
+    # bounded, so a failed match costs at most a few dozen steps per digit
+    # run instead of backtracking over the rest of the text.
+    "ADDRESS": (r'\b\d{1,6}\s+(?:[A-Za-z0-9]+[\s,]+){0,8}?'
+                r'(?:street|st|avenue|ave|road|rd|boulevard|blvd|drive|dr|court|ct|lane|ln|way|parkway|pkwy)\b'),
+}
+
+ENTITY_SCANNER = re.compile(
+    "|".join(f"(?P<{entity_type}>{pattern})" for entity_type, pattern in ENTITY_PATTERNS.items()),
+    re.IGNORECASE
+)
+
+def scan_entities(text: str) -> Iterator[Tuple[str, str, int, int]]:
+    """Yield (type, value, start, end) for every pattern match in a single pass over the text."""
+    for match in ENTITY_SCANNER.finditer(text):
+        yield match.lastgroup, match.group(), match.start(), match.end()
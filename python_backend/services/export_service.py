@@ -3,17 +3,24 @@
 Service for exporting analysis results to various document formats.
 """
 import os
+import io
+import re
 import time
 import base64
-import tempfile
-from typing import Dict, Any
+import functools
+from typing import Dict, Any, Callable, Iterable, Iterator, List, Tuple
+from xml.sax.saxutils import escape
 import json
 from fastapi import BackgroundTasks, HTTPException
 import pandas as pd
 from datetime import datetime
 
 from models.schemas import ExportRequest, ExportResponse
-from utils.temp_files import cleanup_files
+from utils.temp_files import cleanup_files, scratch
+from utils.excel_writer import Sheet, dataframe_rows, write_xlsx
+from utils.worker_pool import run_cpu, run_io
+from services.export_store import export_store
+from config.settings import EXPORT_PPTX_TEMPLATE, EXPORT_DOCX_TEMPLATE, EXPORT_TTL
 
 async def generate_export(export_request: ExportRequest, background_tasks: BackgroundTasks) -> ExportResponse:
     """
@@ -30,41 +37,36 @@ async def generate_export(export_request: ExportRequest, background_tasks: Backg
     
     try:
         # Validate the export format
-        if export_request.format not in ['pdf', 'pptx', 'xlsx', 'docx']:
+        if export_request.format not in EXPORT_RENDERERS:
             raise HTTPException(status_code=400, detail="Unsupported export format")
+        scratch.check_quota()
             
         # Get a unique filename for the export
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_filename = f"{export_request.title.replace(' ', '_')}_{timestamp}.{export_request.format}"
+        # The title becomes part of a file name and of Content-Disposition;
+        # spaces, control characters and path separators are replaced
+        safe_title = re.sub(r'[\s\x00-\x1f\x7f/\\]', '_', export_request.title)
+        output_filename = f"{safe_title}_{timestamp}.{export_request.format}"
         
-        # Create a temporary directory for the export
-        output_path = os.path.join(tempfile.gettempdir(), output_filename)
-        temp_files.append(output_path)
+        # Reserve a directory for the export in the managed export store;
+        # it is kept for EXPORT_TTL seconds and served by GET /exports/{export_id}
+        export_id, output_path = await run_io(export_store.create, output_filename)
+        temp_files.append(os.path.dirname(output_path))
         
-        # Generate the export based on the requested format
-        if export_request.format == 'xlsx':
-            export_to_excel(export_request.analysis_data, output_path)
-        elif export_request.format == 'pdf':
-            export_to_pdf(export_request.analysis_data, output_path)
-        elif export_request.format == 'pptx':
-            export_to_powerpoint(export_request.analysis_data, output_path)
-        elif export_request.format == 'docx':
-            export_to_word(export_request.analysis_data, output_path)
+        # Render in the process pool so concurrent exports use every core
+        # and never share document or figure state
+        await run_cpu(render_export, export_request.format, export_request.analysis_data, output_path)
         
-        # In a production environment, you would upload this file to a storage service
-        # and return a download URL. For this example, we'll simulate a download URL.
-        # In a real-world scenario, this might be a signed URL from S3, Azure, or similar.
-        download_url = f"https://example.com/exports/{output_filename}"
-        
-        # Add cleanup task for temporary files
-        background_tasks.add_task(cleanup_files, temp_files)
+        download_url = f"/exports/{export_id}"
         
         # Prepare metadata
         metadata = {
             "processing_time": time.time() - start_time,
             "export_timestamp": datetime.now().isoformat(),
             "output_format": export_request.format,
-            "file_size": os.path.getsize(output_path) if os.path.exists(output_path) else 0
+            "export_id": export_id,
+            "expires_in": EXPORT_TTL,
+            "file_size": await run_io(_file_size, output_path)
         }
         
         return ExportResponse(
@@ -75,132 +77,175 @@ async def generate_export(export_request: ExportRequest, background_tasks: Backg
             metadata=metadata
         )
         
+    except HTTPException:
+        background_tasks.add_task(cleanup_files, temp_files)
+        raise
     except Exception as e:
         # Clean up any temporary files
         background_tasks.add_task(cleanup_files, temp_files)
         raise HTTPException(status_code=500, detail=str(e))
 
+def _file_size(path: str) -> int:
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+def render_export(export_format: str, analysis_data: Dict[str, Any], output_path: str) -> None:
+    """Render an export to `output_path`; runs in a worker process."""
+    EXPORT_RENDERERS[export_format](analysis_data, output_path)
+
+@functools.lru_cache(maxsize=None)
+def _template_bytes(export_format: str) -> bytes:
+    """
+    The pptx/docx template as bytes, read once per worker process.
+
+    Uses the configured template file, or the library's default template.
+    New documents are opened from these bytes, so no template is parsed
+    from the package directory on every export.
+    """
+    template_path = EXPORT_PPTX_TEMPLATE if export_format == 'pptx' else EXPORT_DOCX_TEMPLATE
+    if template_path:
+        with open(template_path, 'rb') as f:
+            return f.read()
+
+    buffer = io.BytesIO()
+    if export_format == 'pptx':
+        from pptx import Presentation
+        Presentation().save(buffer)
+    else:
+        from docx import Document
+        Document().save(buffer)
+    return buffer.getvalue()
+
 def export_to_excel(analysis_data: Dict[str, Any], output_path: str) -> None:
     """Export analysis data to Excel format."""
     try:
-        # Create a Pandas Excel writer
-        with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-            # Summary sheet
-            summary_data = {
-                'Item': ['Analysis Result', 'Processing Time', 'Analysis Date'],
-                'Value': [
-                    analysis_data.get('analysis_result', 'N/A'),
-                    f"{analysis_data.get('metadata', {}).get('processing_time', 0):.2f} seconds",
-                    analysis_data.get('metadata', {}).get('processing_timestamp', 'N/A')
-                ]
-            }
-            pd.DataFrame(summary_data).to_excel(writer, sheet_name='Summary', index=False)
-            
-            # Data Preview sheet if available
-            if 'data_summary' in analysis_data and 'head' in analysis_data['data_summary']:
-                df = pd.DataFrame(analysis_data['data_summary']['head'])
-                df.to_excel(writer, sheet_name='Data Preview', index=False)
-                
-            # Data Summary sheet
-            if 'data_summary' in analysis_data:
-                summary = analysis_data['data_summary']
-                data = {
-                    'Metric': [],
-                    'Value': []
-                }
-                
-                if 'shape' in summary:
-                    data['Metric'].append('Total Rows')
-                    data['Value'].append(summary['shape'][0])
-                    data['Metric'].append('Total Columns')
-                    data['Value'].append(summary['shape'][1])
-                    
-                if 'dtypes' in summary:
-                    for col, dtype in summary['dtypes'].items():
-                        data['Metric'].append(f"Column '{col}' Type")
-                        data['Value'].append(dtype)
-                        
-                if 'missing_values' in summary:
-                    for col, count in summary['missing_values'].items():
-                        if count > 0:
-                            data['Metric'].append(f"Missing in '{col}'")
-                            data['Value'].append(count)
-                            
-                pd.DataFrame(data).to_excel(writer, sheet_name='Data Stats', index=False)
+        write_xlsx(output_path, _excel_sheets(analysis_data))
     except Exception as e:
         raise Exception(f"Failed to export to Excel: {str(e)}")
 
+def _excel_sheets(analysis_data: Dict[str, Any]) -> Iterator[Sheet]:
+    """Yield the sheets of an analysis export, for the streaming xlsx writer."""
+    # Summary sheet
+    yield 'Summary', ['Item', 'Value'], [
+        ['Analysis Result', analysis_data.get('analysis_result', 'N/A')],
+        ['Processing Time', f"{analysis_data.get('metadata', {}).get('processing_time', 0):.2f} seconds"],
+        ['Analysis Date', analysis_data.get('metadata', {}).get('processing_timestamp', 'N/A')]
+    ]
+
+    # Data Preview sheet if available
+    if 'data_summary' in analysis_data and 'head' in analysis_data['data_summary']:
+        df = pd.DataFrame(analysis_data['data_summary']['head'])
+        yield 'Data Preview', [str(col) for col in df.columns], dataframe_rows(df)
+
+    # Data Summary sheet
+    if 'data_summary' in analysis_data:
+        summary = analysis_data['data_summary']
+        rows = []
+
+        if 'shape' in summary:
+            rows.append(['Total Rows', summary['shape'][0]])
+            rows.append(['Total Columns', summary['shape'][1]])
+
+        if 'dtypes' in summary:
+            for col, dtype in summary['dtypes'].items():
+                rows.append([f"Column '{col}' Type", dtype])
+
+        if 'missing_values' in summary:
+            for col, count in summary['missing_values'].items():
+                if count > 0:
+                    rows.append([f"Missing in '{col}'", count])
+
+        yield 'Data Stats', ['Metric', 'Value'], rows
+
 def export_to_pdf(analysis_data: Dict[str, Any], output_path: str) -> None:
     """Export analysis data to PDF format."""
     try:
-        import matplotlib.pyplot as plt
-        from matplotlib.backends.backend_pdf import PdfPages
-        
-        with PdfPages(output_path) as pdf:
-            # Title page
-            plt.figure(figsize=(8.5, 11))
-            plt.text(0.5, 0.9, "Data Analysis Report", ha='center', va='center', fontsize=24)
-            plt.text(0.5, 0.8, f"Generated on: {analysis_data.get('metadata', {}).get('processing_timestamp', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))}", 
-                    ha='center', fontsize=12)
-            plt.axis('off')
-            pdf.savefig()
-            plt.close()
-            
-            # Analysis result page
-            plt.figure(figsize=(8.5, 11))
-            plt.text(0.5, 0.95, "Analysis Results", ha='center', fontsize=16)
-            
-            # Split the analysis text to fit on page
-            analysis_text = analysis_data.get('analysis_result', 'No analysis available.')
-            text_parts = [analysis_text[i:i+100] for i in range(0, len(analysis_text), 100)]
-            
-            y_position = 0.85
-            for part in text_parts:
-                plt.text(0.1, y_position, part, fontsize=10, wrap=True)
-                y_position -= 0.05
-                if y_position < 0.1:
-                    pdf.savefig()
-                    plt.close()
-                    plt.figure(figsize=(8.5, 11))
-                    y_position = 0.9
-            
-            plt.axis('off')
-            pdf.savefig()
-            plt.close()
-            
-            # Data summary page
-            if 'data_summary' in analysis_data:
-                plt.figure(figsize=(8.5, 11))
-                plt.text(0.5, 0.95, "Data Summary", ha='center', fontsize=16)
-                
-                y_position = 0.85
-                summary = analysis_data['data_summary']
-                
-                if 'shape' in summary:
-                    plt.text(0.1, y_position, f"Dataset Shape: {summary['shape'][0]} rows × {summary['shape'][1]} columns", fontsize=10)
-                    y_position -= 0.05
-                
-                if 'columns' in summary:
-                    columns_text = f"Columns: {', '.join(summary['columns'][:10])}"
-                    if len(summary['columns']) > 10:
-                        columns_text += f"... and {len(summary['columns']) - 10} more"
-                    plt.text(0.1, y_position, columns_text, fontsize=10)
-                    y_position -= 0.05
-                
-                plt.axis('off')
-                pdf.savefig()
-                plt.close()
+        from reportlab.lib.pagesizes import letter
+        from reportlab.lib.styles import getSampleStyleSheet
+        from reportlab.lib.units import inch
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+
+        styles = getSampleStyleSheet()
+        story = [
+            Paragraph("Data Analysis Report", styles['Title']),
+            Paragraph(escape(f"Generated on: {analysis_data.get('metadata', {}).get('processing_timestamp', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))}"),
+                      styles['Normal']),
+            Spacer(1, 0.3 * inch),
+            Paragraph("Analysis Results", styles['Heading1'])
+        ]
+
+        # Real text flow: one paragraph per block, wrapped and paginated by reportlab
+        analysis_text = analysis_data.get('analysis_result', 'No analysis available.')
+        for block in str(analysis_text).split("\n\n"):
+            if block.strip():
+                story.append(Paragraph(escape(block).replace("\n", "<br/>"), styles['BodyText']))
+
+        # Data summary section
+        if 'data_summary' in analysis_data:
+            summary = analysis_data['data_summary']
+            story.append(Paragraph("Data Summary", styles['Heading1']))
+
+            if 'shape' in summary:
+                story.append(Paragraph(f"Dataset Shape: {summary['shape'][0]} rows × {summary['shape'][1]} columns", styles['BodyText']))
+
+            if 'columns' in summary:
+                columns_text = f"Columns: {', '.join(summary['columns'][:10])}"
+                if len(summary['columns']) > 10:
+                    columns_text += f"... and {len(summary['columns']) - 10} more"
+                story.append(Paragraph(escape(columns_text), styles['BodyText']))
+
+            if 'dtypes' in summary:
+                story.append(Paragraph("Column Types", styles['Heading2']))
+                story.append(_pdf_table(['Column Name', 'Data Type'], summary['dtypes'].items()))
+
+            missing = {col: count for col, count in summary.get('missing_values', {}).items() if count > 0}
+            if missing:
+                story.append(Paragraph("Missing Values", styles['Heading2']))
+                story.append(_pdf_table(['Column', 'Missing Count'], missing.items()))
+                story.append(Spacer(1, 0.2 * inch))
+                story.append(_pdf_bar_chart(missing))
+
+        SimpleDocTemplate(output_path, pagesize=letter, title="Data Analysis Report").build(story)
     except Exception as e:
         raise Exception(f"Failed to export to PDF: {str(e)}")
 
+def _pdf_table(headers: List[str], rows: Iterable[Tuple[Any, Any]]) -> Any:
+    """A two-column reportlab table with a shaded header row."""
+    from reportlab.lib import colors
+    from reportlab.platypus import Table, TableStyle
+
+    table = Table([headers] + [[str(key), str(value)] for key, value in rows], repeatRows=1, hAlign='LEFT')
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+    ]))
+    return table
+
+def _pdf_bar_chart(values: Dict[str, Any], max_bars: int = 20) -> Any:
+    """A vector bar chart of the largest `values`, drawn natively in the PDF."""
+    from reportlab.graphics.shapes import Drawing
+    from reportlab.graphics.charts.barcharts import VerticalBarChart
+
+    top = sorted(values.items(), key=lambda item: item[1], reverse=True)[:max_bars]
+    drawing = Drawing(450, 220)
+    chart = VerticalBarChart()
+    chart.x, chart.y, chart.width, chart.height = 40, 50, 380, 150
+    chart.data = [[count for _, count in top]]
+    chart.categoryAxis.categoryNames = [str(col)[:15] for col, _ in top]
+    chart.categoryAxis.labels.angle = 30
+    chart.categoryAxis.labels.boxAnchor = 'ne'
+    chart.valueAxis.valueMin = 0
+    drawing.add(chart)
+    return drawing
+
 def export_to_powerpoint(analysis_data: Dict[str, Any], output_path: str) -> None:
     """Export analysis data to PowerPoint format."""
     try:
         from pptx import Presentation
         from pptx.util import Inches, Pt
         
-        # Create a presentation
-        prs = Presentation()
+        # Create a presentation from the cached template
+        prs = Presentation(io.BytesIO(_template_bytes('pptx')))
         
         # Title slide
         title_slide_layout = prs.slide_layouts[0]
@@ -266,7 +311,7 @@ def export_to_word(analysis_data: Dict[str, Any], output_path: str) -> None:
         from docx.shared import Inches, Pt, RGBColor
         from docx.enum.text import WD_ALIGN_PARAGRAPH
         
-        doc = Document()
+        doc = Document(io.BytesIO(_template_bytes('docx')))
         
         # Add title
         title = doc.add_heading('Data Analysis Report', 0)
@@ -338,3 +383,11 @@ def export_to_word(analysis_data: Dict[str, Any], output_path: str) -> None:
         doc.save(output_path)
     except Exception as e:
         raise Exception(f"Failed to export to Word: {str(e)}")
+
+# Export renderers by format, used by render_export in the worker processes
+EXPORT_RENDERERS: Dict[str, Callable[[Dict[str, Any], str], None]] = {
+    'xlsx': export_to_excel,
+    'pdf': export_to_pdf,
+    'pptx': export_to_powerpoint,
+    'docx': export_to_word,
+}
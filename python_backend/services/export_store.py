@@ -0,0 +1,67 @@
+"""
+Managed directory of generated /export reports, served by GET /exports/{export_id}.
+"""
+import os
+import re
+import shutil
+import time
+import uuid
+from typing import Optional, Tuple
+
+from utils.temp_files import TEMP_DIR, scratch
+from config.settings import EXPORT_DIR, EXPORT_TTL
+
+_EXPORT_ID = re.compile(r'^[0-9a-f]{32}$')
+
+class ExportStore:
+    """
+    Keep each export in its own directory, `<export_dir>/<export_id>/<filename>`,
+    for `ttl` seconds after it was written. Expired exports are never served;
+    they are deleted when looked up, when a new export is created, and by
+    the scratch sweeper.
+    """
+
+    def __init__(self, export_dir: str, ttl: int):
+        self.export_dir = export_dir
+        self.ttl = ttl
+        os.makedirs(export_dir, exist_ok=True)
+
+    def create(self, filename: str) -> Tuple[str, str]:
+        """Reserve a new export; returns (export_id, path to write the file to)."""
+        self.sweep()
+        export_id = uuid.uuid4().hex
+        export_path = os.path.join(self.export_dir, export_id)
+        os.makedirs(export_path)
+        return export_id, os.path.join(export_path, os.path.basename(filename))
+
+    def resolve(self, export_id: str) -> Optional[str]:
+        """Return the file of an unexpired export, or None."""
+        if not _EXPORT_ID.match(export_id):
+            return None
+        export_path = os.path.join(self.export_dir, export_id)
+        try:
+            with os.scandir(export_path) as entries:
+                files = [entry for entry in entries if entry.is_file()]
+        except FileNotFoundError:
+            return None
+        if not files or files[0].stat().st_mtime < time.time() - self.ttl:
+            self.delete(export_id)
+            return None
+        return files[0].path
+
+    def delete(self, export_id: str) -> None:
+        shutil.rmtree(os.path.join(self.export_dir, export_id), ignore_errors=True)
+
+    def sweep(self) -> None:
+        """Remove exports older than the TTL."""
+        cutoff = time.time() - self.ttl
+        for entry in os.scandir(self.export_dir):
+            try:
+                if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+            except FileNotFoundError:
+                pass
+
+# Shared export store for /export and /exports
+export_store = ExportStore(EXPORT_DIR or os.path.join(TEMP_DIR, "reports"), EXPORT_TTL)
+scratch.add_sweeper(export_store.sweep)
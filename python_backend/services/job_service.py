@@ -0,0 +1,201 @@
+"""
+Asynchronous processing jobs: submit a document, poll its progress, fetch the result.
+"""
+import asyncio
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+from fastapi import BackgroundTasks, HTTPException
+
+from models.schemas import FileRequest, ProcessingResponse, JobProgress, JobStatus
+from services.document_processor import process_document_handler
+from utils.worker_pool import admission
+from config.settings import JOB_WORKERS, MAX_PENDING_JOBS, JOB_RESULT_TTL
+
+class JobBackend(ABC):
+    """
+    Storage for job state and results.
+
+    The in-memory backend below is used by default; subclass this to keep
+    jobs in an external store shared between workers.
+    """
+
+    @abstractmethod
+    def create(self, status: JobStatus) -> None:
+        ...
+
+    @abstractmethod
+    def update(self, job_id: str, **fields) -> None:
+        ...
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[JobStatus]:
+        ...
+
+    @abstractmethod
+    def set_result(self, job_id: str, result: ProcessingResponse) -> None:
+        ...
+
+    @abstractmethod
+    def get_result(self, job_id: str) -> Optional[ProcessingResponse]:
+        ...
+
+class InMemoryJobBackend(JobBackend):
+    """
+    Keep jobs in process memory, dropping finished jobs after a TTL.
+
+    Expired jobs are looked for on every access, at most once every
+    `evict_interval` seconds, so polling does not scan all jobs each time.
+    """
+
+    def __init__(self, result_ttl: int = JOB_RESULT_TTL, evict_interval: float = 10.0):
+        self.result_ttl = result_ttl
+        self.evict_interval = evict_interval
+        self._jobs: Dict[str, JobStatus] = {}
+        self._results: Dict[str, ProcessingResponse] = {}
+        self._evicted_at = 0.0
+
+    def create(self, status: JobStatus) -> None:
+        self._evict_expired()
+        self._jobs[status.job_id] = status
+
+    def update(self, job_id: str, **fields) -> None:
+        if job_id in self._jobs:
+            self._jobs[job_id] = self._jobs[job_id].copy(update=fields)
+
+    def get(self, job_id: str) -> Optional[JobStatus]:
+        self._evict_expired()
+        return self._jobs.get(job_id)
+
+    def set_result(self, job_id: str, result: ProcessingResponse) -> None:
+        self._results[job_id] = result
+
+    def get_result(self, job_id: str) -> Optional[ProcessingResponse]:
+        self._evict_expired()
+        return self._results.get(job_id)
+
+    def _evict_expired(self) -> None:
+        now = time.time()
+        if now - self._evicted_at < self.evict_interval:
+            return
+        self._evicted_at = now
+        cutoff = now - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            self._jobs.pop(job_id, None)
+            self._results.pop(job_id, None)
+
+class JobQueue:
+    """
+    In-process job queue served by a fixed number of worker tasks.
+
+    Workers take /process admission slots like requests do, so jobs and
+    direct requests share the MAX_INFLIGHT_JOBS limit; a worker waits for a
+    slot instead of failing its job with 503.
+    """
+
+    def __init__(self, backend: JobBackend, workers: int = JOB_WORKERS, max_pending: int = MAX_PENDING_JOBS):
+        self.backend = backend
+        self.workers = workers
+        self.max_pending = max_pending
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def _get_queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        return self._queue
+
+    async def start(self) -> None:
+        """Start the worker tasks."""
+        queue = self._get_queue()
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(queue)))
+
+    async def stop(self) -> None:
+        """Cancel the worker tasks."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, file_request: FileRequest) -> JobStatus:
+        """Queue a document for processing and return its initial status."""
+        queue = self._get_queue()
+        if queue.qsize() >= self.max_pending:
+            raise HTTPException(
+                status_code=503,
+                detail="Job queue is full, please retry later",
+                headers={"Retry-After": "30"}
+            )
+
+        status = JobStatus(
+            job_id=uuid.uuid4().hex,
+            file_id=file_request.file_id,
+            status="queued",
+            progress=JobProgress(stage="queued"),
+            created_at=time.time()
+        )
+        self.backend.create(status)
+        queue.put_nowait((status.job_id, file_request))
+        return status
+
+    def get_status(self, job_id: str) -> Optional[JobStatus]:
+        return self.backend.get(job_id)
+
+    def get_result(self, job_id: str) -> Optional[ProcessingResponse]:
+        return self.backend.get_result(job_id)
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            job_id, file_request = await queue.get()
+            try:
+                await self._run_job(job_id, file_request)
+            finally:
+                queue.task_done()
+
+    async def _run_job(self, job_id: str, file_request: FileRequest) -> None:
+        async with admission.admit(reject=False):
+            await self._process(job_id, file_request)
+
+    async def _process(self, job_id: str, file_request: FileRequest) -> None:
+        self.backend.update(job_id, status="running", started_at=time.time())
+
+        def report_progress(stage: str, current: Optional[int] = None, total: Optional[int] = None) -> None:
+            self.backend.update(job_id, progress=JobProgress(stage=stage, current=current, total=total))
+
+        background_tasks = BackgroundTasks()
+        try:
+            result = await process_document_handler(file_request, background_tasks, progress=report_progress)
+            self.backend.set_result(job_id, result)
+            self.backend.update(job_id, status="completed", progress=JobProgress(stage="done"),
+                                finished_at=time.time())
+        except HTTPException as e:
+            self.backend.update(job_id, status="failed", error=str(e.detail),
+                                error_status_code=e.status_code, finished_at=time.time())
+        except Exception as e:
+            self.backend.update(job_id, status="failed", error=str(e),
+                                error_status_code=500, finished_at=time.time())
+        finally:
+            # Run the cleanup tasks that a request would have run after responding
+            await background_tasks()
+
+def get_job_result_or_raise(queue: "JobQueue", job_id: str) -> ProcessingResponse:
+    """Return a finished job's result, or raise the matching HTTP error."""
+    status = queue.get_status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if status.status == "failed":
+        raise HTTPException(status_code=status.error_status_code or 500, detail=status.error)
+    if status.status != "completed":
+        raise HTTPException(status_code=409, detail=f"Job is {status.status}")
+
+    result = queue.get_result(job_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Job result has expired")
+    return result
+
+# Shared job queue for the API
+job_queue = JobQueue(InMemoryJobBackend())
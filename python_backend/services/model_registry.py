@@ -0,0 +1,78 @@
+"""
+Shared registry of heavy models, loaded once per process on first use.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+SPACY_MODEL = "en_core_web_sm"
+
+_models: Dict[str, Any] = {}
+_load_times: Dict[str, float] = {}
+_errors: Dict[str, str] = {}
+_lock = threading.Lock()
+
+def _get(name: str, loader: Callable[[], Any]) -> Any:
+    model = _models.get(name)
+    if model is not None:
+        return model
+    with _lock:
+        # Another thread may have finished loading while we waited
+        if name not in _models:
+            start = time.perf_counter()
+            try:
+                _models[name] = loader()
+            except Exception as e:
+                _errors[name] = str(e)
+                raise
+            _load_times[name] = time.perf_counter() - start
+            _errors.pop(name, None)
+            print(f"Loaded {name} in {_load_times[name]:.2f}s")
+        return _models[name]
+
+def _load_spacy() -> Any:
+    import spacy
+    try:
+        return spacy.load(SPACY_MODEL)
+    except OSError:
+        # Model package missing: fetch it once, then load
+        from spacy.cli import download
+        download(SPACY_MODEL)
+        return spacy.load(SPACY_MODEL)
+
+def get_nlp() -> Any:
+    """The spaCy pipeline used for NER."""
+    return _get("spacy", _load_spacy)
+
+def _load_tesseract_version() -> str:
+    import pytesseract
+    return str(pytesseract.get_tesseract_version())
+
+def get_tesseract_version() -> str:
+    """The installed Tesseract version, looked up once."""
+    return _get("tesseract", _load_tesseract_version)
+
+def warm_up() -> Dict[str, float]:
+    """Load every model now instead of on the first request; returns load times."""
+    for loader in (get_nlp, get_tesseract_version):
+        try:
+            loader()
+        except Exception as e:
+            print(f"Warm-up failed: {str(e)}")
+    return dict(_load_times)
+
+def model_status() -> Dict[str, Dict[str, Optional[Any]]]:
+    """Loaded state of each model in this process, without loading anything."""
+    status = {}
+    for name in ("spacy", "tesseract"):
+        model = _models.get(name)
+        info: Dict[str, Optional[Any]] = {"loaded": model is not None, "load_time": _load_times.get(name)}
+        if name == "spacy" and model is not None:
+            info["name"] = f"{model.meta.get('lang')}_{model.meta.get('name')}"
+            info["version"] = model.meta.get("version")
+        if name == "tesseract" and model is not None:
+            info["version"] = model
+        if name in _errors:
+            info["error"] = _errors[name]
+        status[name] = info
+    return status
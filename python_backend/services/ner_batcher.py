@@ -0,0 +1,73 @@
+"""
+Micro-batching of NER work from documents processed concurrently.
+"""
+import asyncio
+from typing import List, Optional, Tuple
+
+from models.schemas import EntityModel
+from services.ner_service import extract_entities_batch, merge_page_entities
+from utils.worker_pool import run_cpu
+from config.settings import NER_BATCH_SIZE, NER_BATCH_WAIT
+
+class NerBatcher:
+    """
+    Collect NER work from documents processed at the same time and run it in
+    shared `extract_entities_batch` calls.
+
+    Texts are queued until `max_texts` are waiting or `max_wait` seconds have
+    passed since the first one, then go through one nlp.pipe pass on the
+    process pool; each caller gets back the entities of its own texts.
+    """
+
+    def __init__(self, max_texts: int = NER_BATCH_SIZE, max_wait: float = NER_BATCH_WAIT):
+        self.max_texts = max_texts
+        self.max_wait = max_wait
+        self.batches = 0
+        self._pending: List[Tuple[List[str], asyncio.Future]] = []
+        self._pending_texts = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running: List[asyncio.Task] = []
+
+    async def extract(self, texts: List[str]) -> List[List[EntityModel]]:
+        """Entities of each text, like `extract_entities_batch(texts)`."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((texts, future))
+        self._pending_texts += len(texts)
+        if self._pending_texts >= self.max_texts:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    async def extract_entities_with_ner(self, text: str) -> List[EntityModel]:
+        return (await self.extract([text]))[0]
+
+    async def extract_entities_from_pages(self, page_texts: List[str]) -> List[EntityModel]:
+        return merge_page_entities(page_texts, await self.extract(page_texts))
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending, self._pending_texts = self._pending, [], 0
+        if pending:
+            task = asyncio.get_running_loop().create_task(self._run(pending))
+            self._running.append(task)
+            task.add_done_callback(self._running.remove)
+
+    async def _run(self, pending: List[Tuple[List[str], asyncio.Future]]) -> None:
+        texts = [text for item_texts, _ in pending for text in item_texts]
+        self.batches += 1
+        try:
+            results = await run_cpu(extract_entities_batch, texts)
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        offset = 0
+        for item_texts, future in pending:
+            if not future.done():
+                future.set_result(results[offset:offset + len(item_texts)])
+            offset += len(item_texts)
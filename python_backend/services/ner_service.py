@@ -1,53 +1,142 @@
-
-import re
-import spacy
-from typing import List
+from typing import Iterable, Iterator, List, Tuple
 from models.schemas import EntityModel
+from services.entity_scanner import scan_entities
+from services.model_registry import get_nlp
+from config.settings import NER_BATCH_SIZE, NER_N_PROCESS, NER_CHUNK_CHARS, NER_CHUNK_OVERLAP
 
-# Load spaCy NER model
-try:
-    nlp = spacy.load("en_core_web_sm")
-except:
-    import os
-    os.system("python -m spacy download en_core_web_sm")
-    nlp = spacy.load("en_core_web_sm")
+def _unused_pipes(nlp) -> List[str]:
+    """Pipeline components that NER does not need (tagger, parser, lemmatizer, ...)."""
+    keep = {"ner", "entity_ruler"}
+    # Keep the shared tok2vec only if the NER component listens to it
+    if "tok2vec" in nlp.pipe_names:
+        if "ner" in getattr(nlp.get_pipe("tok2vec"), "listening_components", []):
+            keep.add("tok2vec")
+    return [name for name in nlp.pipe_names if name not in keep]
 
-def extract_entities_with_ner(text: str) -> List[EntityModel]:
-    """Extract entities using spaCy NER."""
-    entities = []
-    doc = nlp(text)
-    
-    # Process named entities
-    for ent in doc.ents:
-        entities.append(EntityModel(
-            type=ent.label_,
-            value=ent.text,
-            confidence=0.85,  # Default confidence
+# Preferred chunk boundaries, strongest first
+_CHUNK_BOUNDARIES = ("\n\n", "\n", ". ", " ")
+
+def _chunk_spans(text: str, chunk_chars: int, overlap: int) -> List[Tuple[int, int]]:
+    """
+    Split text into overlapping (start, end) spans of at most `chunk_chars`.
+
+    Each span ends at the strongest boundary (paragraph, line, sentence, word)
+    in the second half of its window, and the next span starts `overlap`
+    characters earlier at a word boundary.
+    """
+    spans = []
+    start = 0
+    while True:
+        if len(text) - start <= chunk_chars:
+            spans.append((start, len(text)))
+            return spans
+
+        end = start + chunk_chars
+        for sep in _CHUNK_BOUNDARIES:
+            idx = text.rfind(sep, start + chunk_chars // 2, end)
+            if idx != -1:
+                end = idx + len(sep)
+                break
+        spans.append((start, end))
+
+        next_start = text.find(" ", max(end - overlap, start + 1), end)
+        start = next_start + 1 if next_start != -1 else end
+
+def _iter_chunks(texts: List[str]) -> Iterator[Tuple[str, Tuple[int, int, int, int]]]:
+    """
+    Yield (chunk, (text_index, chunk_start, own_start, own_end)) for every text.
+
+    Each overlap zone is split at its midpoint: a chunk only keeps entities
+    starting in [own_start, own_end), so an entity seen by two chunks is
+    reported once, by the chunk that sees more context around it.
+    """
+    for text_idx, text in enumerate(texts):
+        spans = _chunk_spans(text, NER_CHUNK_CHARS, NER_CHUNK_OVERLAP)
+        for i, (start, end) in enumerate(spans):
+            own_start = 0 if i == 0 else (start + spans[i - 1][1]) // 2
+            own_end = len(text) if i == len(spans) - 1 else (spans[i + 1][0] + end) // 2
+            yield text[start:end], (text_idx, start, own_start, own_end)
+
+def _regex_entities(text: str) -> List[EntityModel]:
+    """Find common data types with the precompiled single-pass scanner."""
+    return [
+        EntityModel(
+            type=entity_type,
+            value=value,
+            confidence=0.9,
             position={
-                "start": ent.start_char,
-                "end": ent.end_char
+                "start": start,
+                "end": end
             }
-        ))
-    
-    # Add custom regex patterns for common data types
-    patterns = {
-        "EMAIL": r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',
-        "PHONE": r'\b(\+\d{1,2}\s?)?\(?\d{3}\)?[\s.-]?\d{3}[\s.-]?\d{4}\b',
-        "DATE": r'\b\d{1,2}[\/\-\.]\d{1,2}[\/\-\.]\d{2,4}\b',
-        "ADDRESS": r'\b\d+\s+[A-Za-z0-9\s,]+(?:street|st|avenue|ave|road|rd|boulevard|blvd|drive|dr|court|ct|lane|ln|way|parkway|pkwy)\b',
-        "MONEY": r'\$\s*\d+(?:\.\d{2})?'
-    }
-    
-    for entity_type, pattern in patterns.items():
-        for match in re.finditer(pattern, text, re.IGNORECASE):
-            entities.append(EntityModel(
-                type=entity_type,
-                value=match.group(),
-                confidence=0.9,
+        )
+        for entity_type, value, start, end in scan_entities(text)
+    ]
+
+def extract_entities_batch(
+    texts: Iterable[str],
+    batch_size: int = NER_BATCH_SIZE,
+    n_process: int = NER_N_PROCESS
+) -> List[List[EntityModel]]:
+    """
+    Extract entities from many texts with one nlp.pipe pass.
+
+    Only the NER components run. Long texts are streamed through spaCy as
+    overlapping chunks, so memory stays flat however long a text is. Returns
+    one entity list per input text, with positions relative to that text.
+    """
+    texts = list(texts)
+    results = [[] for _ in texts]
+    nlp = get_nlp()
+    docs = nlp.pipe(_iter_chunks(texts), as_tuples=True, batch_size=batch_size,
+                    n_process=n_process, disable=_unused_pipes(nlp))
+    for doc, (text_idx, chunk_start, own_start, own_end) in docs:
+        # Process named entities
+        for ent in doc.ents:
+            start = chunk_start + ent.start_char
+            if not own_start <= start < own_end:
+                continue
+            results[text_idx].append(EntityModel(
+                type=ent.label_,
+                value=ent.text,
+                confidence=0.85,  # Default confidence
                 position={
-                    "start": match.start(),
-                    "end": match.end()
+                    "start": start,
+                    "end": chunk_start + ent.end_char
                 }
             ))
     
+    for text, entities in zip(texts, results):
+        entities.extend(_regex_entities(text))
+    
+    return results
+
+def extract_entities_from_pages(page_texts: List[str]) -> List[EntityModel]:
+    """
+    Extract entities from the pages of a document in one batch.
+
+    Each entity gets its 1-based page number, and positions are offsets into
+    the concatenated page texts.
+    """
+    return merge_page_entities(page_texts, extract_entities_batch(page_texts))
+
+def merge_page_entities(page_texts: List[str], entities_per_page: List[List[EntityModel]]) -> List[EntityModel]:
+    """
+    Combine per-page entity lists into one for the whole document, setting
+    page numbers and shifting positions to the concatenated text.
+    """
+    entities = []
+    offset = 0
+    for page_num, (page_text, page_entities) in enumerate(zip(page_texts, entities_per_page)):
+        for entity in page_entities:
+            entity.page_number = page_num + 1
+            entity.position = {
+                "start": entity.position["start"] + offset,
+                "end": entity.position["end"] + offset
+            }
+            entities.append(entity)
+        offset += len(page_text)
     return entities
+
+def extract_entities_with_ner(text: str) -> List[EntityModel]:
+    """Extract entities using spaCy NER."""
+    return extract_entities_batch([text])[0]
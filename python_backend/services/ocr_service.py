@@ -1,52 +1,73 @@
-
-import cv2
 import numpy as np
-import pytesseract
-from PIL import Image
-import fitz  # PyMuPDF
+from typing import List, Tuple
+
+from config.settings import MIN_TEXT_LAYER_CHARS
+
+def extract_text_from_pdf(file_path: str) -> Tuple[List[str], List[int]]:
+    """
+    Extract the text layer of each PDF page without rendering.
 
-def extract_text_from_pdf(file_path: str) -> tuple:
-    """Extract text from PDF and convert pages to images."""
+    Returns the page texts and the numbers of the pages that need OCR: pages
+    with fewer than MIN_TEXT_LAYER_CHARS characters of text that contain
+    images. Blank pages are not OCR'd.
+    """
+    import fitz  # PyMuPDF
+    
     try:
-        doc = fitz.open(file_path)
-        text = ""
-        images = []
-        
-        for page_num, page in enumerate(doc):
-            # Extract text
-            text += page.get_text()
-            
-            # Convert to image
-            pix = page.get_pixmap(matrix=fitz.Matrix(300/72, 300/72))
-            img_path = f"{file_path}_page_{page_num}.png"
-            pix.save(img_path)
-            images.append(img_path)
-        
-        return text, images
+        page_texts = []
+        ocr_pages = []
+        with fitz.open(file_path) as doc:
+            for page_num, page in enumerate(doc):
+                page_text = page.get_text()
+                page_texts.append(page_text)
+                if len(page_text.strip()) < MIN_TEXT_LAYER_CHARS and page.get_images():
+                    ocr_pages.append(page_num)
+        return page_texts, ocr_pages
     except Exception as e:
         print(f"Error extracting text from PDF: {str(e)}")
-        return "", []
+        return [], []
 
-def process_image_with_ocr(image_path: str) -> str:
-    """Process image with Tesseract OCR."""
+def render_pdf_page(file_path: str, page_num: int) -> np.ndarray:
+    """Render a single PDF page at 300 DPI to a grayscale array, in memory."""
+    import fitz  # PyMuPDF
+    
+    with fitz.open(file_path) as doc:
+        pix = doc[page_num].get_pixmap(matrix=fitz.Matrix(300/72, 300/72), colorspace=fitz.csGRAY, alpha=False)
+        # Rows may be padded, so view the buffer by stride and crop to the page width
+        samples = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)
+        return np.ascontiguousarray(samples[:, :pix.width])
+
+def ocr_pdf_page(file_path: str, page_num: int) -> str:
+    """Render a single PDF page and OCR it; runs as one unit in a worker process."""
+    try:
+        gray = render_pdf_page(file_path, page_num)
+    except Exception as e:
+        print(f"Error rendering PDF page {page_num}: {str(e)}")
+        return ""
+    return ocr_image_array(gray)
+
+def ocr_image_array(gray: np.ndarray) -> str:
+    """Threshold a grayscale image array and OCR it with Tesseract."""
+    import cv2
+    import pytesseract
+    
     try:
-        # Read image
-        img = cv2.imread(image_path)
-        
-        # Convert to grayscale
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
         # Apply thresholding
         _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
         
-        # Save processed image
-        processed_img_path = f"{image_path}_processed.png"
-        cv2.imwrite(processed_img_path, thresh)
-        
         # Use Tesseract for OCR
-        text = pytesseract.image_to_string(Image.open(processed_img_path))
-        
-        return text
+        return pytesseract.image_to_string(thresh)
     except Exception as e:
         print(f"Error processing image with OCR: {str(e)}")
         return ""
+
+def process_image_with_ocr(image_path: str) -> str:
+    """Process image with Tesseract OCR."""
+    import cv2
+    
+    # Read image straight to grayscale
+    gray = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        print(f"Error processing image with OCR: could not read {image_path}")
+        return ""
+    return ocr_image_array(gray)
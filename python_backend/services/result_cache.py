@@ -0,0 +1,170 @@
+"""
+Content-addressed cache of finished /process results.
+"""
+import hashlib
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from models.schemas import ProcessingResponse
+from models.tabular import TabularData
+from config.settings import (
+    PIPELINE_VERSION, MAX_ROWS_PER_SHEET, MIN_TEXT_LAYER_CHARS, INLINE_SHEETS,
+    RESULT_CACHE_MAX_BYTES, RESULT_CACHE_DIR, RESULT_CACHE_DISK_MAX_BYTES
+)
+
+def make_cache_key(file_digest: str, file_type: str) -> str:
+    """Build a cache key from the file digest, pipeline version and the options that shape the output."""
+    parts = [file_digest, PIPELINE_VERSION, file_type, str(MAX_ROWS_PER_SHEET), str(MIN_TEXT_LAYER_CHARS), str(INLINE_SHEETS)]
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+class ResultCache:
+    """
+    Two-tier LRU cache of ProcessingResponses and their result tables.
+
+    The memory tier holds serialized responses plus tables up to `max_bytes`.
+    If `disk_dir` is set, entries are also written there as one blob per key
+    (zlib-compressed JSON followed by the table, see TabularData.serialize),
+    evicted oldest access first once the directory grows past `disk_max_bytes`.
+    """
+
+    def __init__(self, max_bytes: int, disk_dir: Optional[str] = None, disk_max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[bytes, Optional[TabularData]]]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self._disk_size = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_size = sum(entry.stat().st_size for entry in os.scandir(disk_dir) if entry.is_file())
+
+    def get(self, key: str) -> Optional[Tuple[ProcessingResponse, Optional[TabularData]]]:
+        """Return the cached response and table for `key`, counting the hit or miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None and not entry[1].available():
+                # The pages of a spreadsheet table were evicted; process it again
+                self._entries.pop(key)
+                self._size -= self._sizes.pop(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+            else:
+                entry = self._read_disk(key)
+                if entry is not None:
+                    self._store_memory(key, entry)
+
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        data, table = entry
+        return ProcessingResponse.parse_raw(data), table
+
+    def put(self, key: str, response: ProcessingResponse, table: Optional[TabularData] = None) -> None:
+        """Store a response and its table under `key`."""
+        entry = (response.json().encode(), table)
+        with self._lock:
+            self._store_memory(key, entry)
+            self._write_disk(key, entry)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counts and tier sizes."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "memory_bytes": self._size,
+            "disk_bytes": self._disk_size
+        }
+
+    def _store_memory(self, key: str, entry: Tuple[bytes, Optional[TabularData]]) -> None:
+        data, table = entry
+        size = len(data) + (table.nbytes if table is not None else 0)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._entries.pop(key)
+            self._size -= self._sizes.pop(key)
+        self._entries[key] = entry
+        self._sizes[key] = size
+        self._size += size
+        while self._size > self.max_bytes:
+            evicted, _ = self._entries.popitem(last=False)
+            self._size -= self._sizes.pop(evicted)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.result")
+
+    def _read_disk(self, key: str) -> Optional[Tuple[bytes, Optional[TabularData]]]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                blob = f.read()
+            # Mark as recently used for eviction
+            os.utime(path)
+            (json_size,) = struct.unpack_from(">Q", blob)
+            data = zlib.decompress(blob[8:8 + json_size])
+            table_ipc = blob[8 + json_size:]
+            table = None
+            if table_ipc:
+                table = TabularData.deserialize(table_ipc)
+                if table is None:
+                    return None
+            return data, table
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Error reading result cache entry {key}: {str(e)}")
+            return None
+
+    def _write_disk(self, key: str, entry: Tuple[bytes, Optional[TabularData]]) -> None:
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            data, table = entry
+            compressed = zlib.compress(data)
+            blob = struct.pack(">Q", len(compressed)) + compressed
+            if table is not None:
+                blob += table.serialize()
+            if os.path.exists(path):
+                self._disk_size -= os.path.getsize(path)
+            # Write then rename so readers never see a partial blob
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(blob)
+            os.replace(tmp_path, path)
+            self._disk_size += len(blob)
+            if self._disk_size > self.disk_max_bytes:
+                self._evict_disk()
+        except Exception as e:
+            print(f"Error writing result cache entry {key}: {str(e)}")
+
+    def _evict_disk(self) -> None:
+        entries = sorted(
+            (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+            for entry in os.scandir(self.disk_dir)
+            if entry.is_file() and entry.name.endswith(".result")
+        )
+        for _, size, path in entries:
+            if self._disk_size <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+                self._disk_size -= size
+            except FileNotFoundError:
+                pass
+
+# Shared result cache for /process
+result_cache = ResultCache(RESULT_CACHE_MAX_BYTES, RESULT_CACHE_DIR, RESULT_CACHE_DISK_MAX_BYTES)
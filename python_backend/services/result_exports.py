@@ -0,0 +1,111 @@
+"""
+Excel exports of stored result tables, generated on first download.
+"""
+import asyncio
+import os
+import threading
+import uuid
+from typing import Dict
+
+from fastapi import HTTPException
+
+from models.tabular import TabularData
+from services.dataframe_service import export_to_excel
+from services.table_store import table_store
+from utils.temp_files import TEMP_DIR
+from utils.worker_pool import run_cpu, run_io
+from config.settings import EXPORT_CACHE_DIR, EXPORT_CACHE_MAX_BYTES
+
+class ResultExports:
+    """
+    On-demand xlsx exports of result tables, cached on disk.
+
+    Files are named after the result cache key of the table, so every
+    file_id with the same content and pipeline version shares one export.
+    The directory is evicted oldest access first once it grows past
+    `max_bytes`.
+    """
+
+    def __init__(self, export_dir: str, max_bytes: int):
+        self.export_dir = export_dir
+        self.max_bytes = max_bytes
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # Requests holding or waiting for each lock; it is dropped at zero
+        self._lock_users: Dict[str, int] = {}
+        self._disk_lock = threading.Lock()
+        os.makedirs(export_dir, exist_ok=True)
+
+    async def get_xlsx(self, file_id: str) -> str:
+        """Return the path of the xlsx export for a processed file, building it if needed."""
+        entry = table_store.get_entry(file_id)
+        if entry is None or not entry[0].available():
+            raise HTTPException(status_code=404, detail="No stored table for this file_id; process it again")
+        table, result_key = entry
+        if table.total_rows == 0:
+            raise HTTPException(status_code=404, detail="The result table is empty, nothing to export")
+
+        path = os.path.join(self.export_dir, f"{result_key}.xlsx")
+        # One build per export at a time; concurrent downloads wait for it
+        lock = self._locks.setdefault(result_key, asyncio.Lock())
+        self._lock_users[result_key] = self._lock_users.get(result_key, 0) + 1
+        try:
+            async with lock:
+                built = False
+                if not await run_io(self._touch, path):
+                    await self._build(table, path)
+                    built = True
+        finally:
+            # Keep the lock while anyone still waits on it, also after a failed build
+            self._lock_users[result_key] -= 1
+            if not self._lock_users[result_key]:
+                del self._lock_users[result_key]
+                del self._locks[result_key]
+        if built:
+            await run_io(self._evict)
+        return path
+
+    async def _build(self, table: TabularData, path: str) -> None:
+        # A unique temp name, so a build never writes into another one's file
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp.xlsx"
+        try:
+            if not await run_cpu(export_to_excel, table, tmp_path):
+                raise HTTPException(status_code=500, detail="Failed to build the Excel export")
+            await run_io(os.replace, tmp_path, path)
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _touch(self, path: str) -> bool:
+        """Mark an existing export as recently used; False when it does not exist."""
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _evict(self) -> None:
+        with self._disk_lock:
+            entries = sorted(
+                (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                for entry in os.scandir(self.export_dir)
+                if entry.is_file() and not entry.name.endswith(".tmp.xlsx")
+            )
+            size = sum(entry_size for _, entry_size, _ in entries)
+            # Never evict the newest export, which is about to be served
+            for _, entry_size, path in entries[:-1]:
+                if size <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    size -= entry_size
+                except FileNotFoundError:
+                    pass
+
+# Shared export cache for the /results endpoints
+result_exports = ResultExports(EXPORT_CACHE_DIR or os.path.join(TEMP_DIR, "exports"), EXPORT_CACHE_MAX_BYTES)
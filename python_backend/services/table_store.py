@@ -0,0 +1,117 @@
+"""
+Store of processed result tables, for downloads after /process has returned.
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from fastapi import HTTPException
+
+from models.schemas import TableRowsResponse
+from models.tabular import TabularData, json_rows
+from config.settings import TABLE_STORE_MAX_BYTES, MAX_ROWS_PER_SHEET
+
+class TableStore:
+    """
+    Size-bounded LRU of result tables keyed by file_id.
+
+    Each table is stored with the result cache key it was produced under, so
+    artifacts derived from it (such as Excel exports) can be shared between
+    file_ids with the same content.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._tables: "OrderedDict[str, Tuple[TabularData, str]]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def put(self, file_id: str, table: TabularData, result_key: str) -> None:
+        size = table.nbytes
+        if size > self.max_bytes:
+            print(f"Table for {file_id} is larger than the table store, not keeping it")
+            return
+        with self._lock:
+            if file_id in self._tables:
+                self._tables.pop(file_id)
+                self._size -= self._sizes.pop(file_id)
+            self._tables[file_id] = (table, result_key)
+            self._sizes[file_id] = size
+            self._size += size
+            while self._size > self.max_bytes:
+                evicted, _ = self._tables.popitem(last=False)
+                self._size -= self._sizes.pop(evicted)
+
+    def get_entry(self, file_id: str) -> Optional[Tuple[TabularData, str]]:
+        """Return (table, result key) for a file_id."""
+        with self._lock:
+            entry = self._tables.get(file_id)
+            if entry is not None:
+                self._tables.move_to_end(file_id)
+            return entry
+
+    def get(self, file_id: str) -> Optional[TabularData]:
+        entry = self.get_entry(file_id)
+        return entry[0] if entry is not None else None
+
+# Shared table store for the API
+table_store = TableStore(TABLE_STORE_MAX_BYTES)
+
+def get_table_or_404(file_id: str) -> TabularData:
+    """Return the stored table for a processed file, or raise 404."""
+    table = table_store.get(file_id)
+    # Spreadsheet tables are paged on disk and can be evicted from the spreadsheet cache
+    if table is None or not table.available():
+        raise HTTPException(status_code=404, detail="No stored table for this file_id; process it again")
+    return table
+
+def get_sheet_rows(file_id: str, sheet_index: int) -> TableRowsResponse:
+    """Return one sheet page (0-based, as in `data_frame.sheets`) of a processed file."""
+    table = get_table_or_404(file_id)
+    try:
+        name, sheet_df = table.sheet(sheet_index)
+    except IndexError:
+        raise HTTPException(status_code=404, detail=f"Sheet {sheet_index} out of range, table has {table.sheet_count} sheets")
+    return TableRowsResponse(
+        file_id=file_id,
+        headers=table.headers,
+        rows=json_rows(sheet_df),
+        offset=sheet_index * MAX_ROWS_PER_SHEET,
+        row_count=len(sheet_df),
+        total_rows=table.total_rows,
+        sheet=name
+    )
+
+def parse_filters(filters: Optional[List[str]]) -> Dict[str, str]:
+    """Parse `column:value` filter strings into a dict."""
+    parsed = {}
+    for item in filters or []:
+        column, sep, value = item.partition(":")
+        if not sep:
+            raise HTTPException(status_code=400, detail=f"Invalid filter {item!r}, expected column:value")
+        parsed[column] = value
+    return parsed
+
+def get_row_range(
+    file_id: str,
+    offset: int = 0,
+    limit: int = MAX_ROWS_PER_SHEET,
+    columns: Optional[List[str]] = None,
+    filters: Optional[List[str]] = None
+) -> TableRowsResponse:
+    """Return a row range of a processed file, with optional column projection and equality filters."""
+    table = get_table_or_404(file_id)
+    conditions = parse_filters(filters)
+    unknown = [col for col in list(columns or []) + list(conditions) if col not in table.headers]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown columns: {', '.join(unknown)}")
+
+    rows_df, matched = table.select(offset, limit, columns, conditions)
+    return TableRowsResponse(
+        file_id=file_id,
+        headers=list(rows_df.columns),
+        rows=json_rows(rows_df),
+        offset=offset,
+        row_count=len(rows_df),
+        total_rows=matched
+    )
@@ -0,0 +1,192 @@
+import os
+import shutil
+from typing import Dict, Iterator, List, Optional
+import numpy as np
+import pandas as pd
+
+from models.tabular import PagedTable, PagedTableWriter
+from utils.file_utils import file_sha256
+from utils.temp_files import TEMP_DIR
+from config.settings import MAX_ROWS_PER_SHEET, SPREADSHEET_CACHE_DIR, SPREADSHEET_CACHE_MAX_BYTES
+
+def _dedupe_headers(headers: List[str], unnamed: List[int]) -> List[str]:
+    """
+    Rename repeated column names to name.1, name.2, ... as pandas does,
+    skipping names already taken and renaming the `unnamed` columns last.
+    """
+    headers = list(headers)
+    counts: Dict[str, int] = {}
+    loop_order = [idx for idx in range(len(headers)) if idx not in unnamed] + unnamed
+    for idx in loop_order:
+        col = base = headers[idx]
+        cur_count = counts.get(col, 0)
+        while cur_count > 0:
+            counts[base] = cur_count + 1
+            col = f"{base}.{cur_count}"
+            cur_count = cur_count + 1 if col in headers else counts.get(col, 0)
+        headers[idx] = col
+        counts[col] = cur_count + 1
+    return headers
+
+def _xlsx_headers(header_row: tuple) -> List[str]:
+    """Column names for an xlsx header row, named and de-duplicated like pd.read_excel."""
+    unnamed = [idx for idx, value in enumerate(header_row) if value is None]
+    headers = [str(value) if value is not None else f"Unnamed: {idx}" for idx, value in enumerate(header_row)]
+    return _dedupe_headers(headers, unnamed)
+
+def _xlsx_frame(rows: List[tuple], headers: List[str]) -> pd.DataFrame:
+    # Missing cells become NaN in every column, as with pd.read_excel
+    return pd.DataFrame(rows, columns=headers).fillna(np.nan)
+
+def _iter_xlsx_chunks(file_path: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        headers = _xlsx_headers(next(rows, ()))
+        empty_row = (None,) * len(headers)
+        batch = []
+        # Blank rows are held back until a row with data follows, so only
+        # trailing ones (which read-only sheets can over-report) are dropped
+        blank_rows = 0
+        for row in rows:
+            row = tuple(row[:len(headers)]) + (None,) * (len(headers) - len(row))
+            if row == empty_row:
+                blank_rows += 1
+                continue
+            for pending in [empty_row] * blank_rows + [row]:
+                batch.append(pending)
+                if len(batch) == chunk_rows:
+                    yield _xlsx_frame(batch, headers)
+                    batch = []
+            blank_rows = 0
+        if batch:
+            yield _xlsx_frame(batch, headers)
+    finally:
+        workbook.close()
+
+def _slice_dataframe(df: pd.DataFrame, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    for start_idx in range(0, len(df), chunk_rows):
+        yield df.iloc[start_idx:start_idx + chunk_rows]
+
+def iter_spreadsheet_chunks(file_path: str, chunk_rows: int = MAX_ROWS_PER_SHEET) -> Iterator[pd.DataFrame]:
+    """
+    Parse a spreadsheet as DataFrames of `chunk_rows` rows (the last may be
+    shorter).
+
+    CSV is read with pandas' chunked reader and XLSX with openpyxl in
+    read-only mode, so only one chunk is in memory at a time. Legacy XLS has
+    no streaming reader and is parsed whole, then sliced.
+    """
+    if file_path.endswith('.csv'):
+        yield from pd.read_csv(file_path, chunksize=chunk_rows)
+    elif file_path.endswith('.xlsx'):
+        yield from _iter_xlsx_chunks(file_path, chunk_rows)
+    elif file_path.endswith('.xls'):
+        yield from _slice_dataframe(pd.read_excel(file_path), chunk_rows)
+    else:
+        raise ValueError(f"Unsupported file format: {file_path.split('.')[-1]}")
+
+class SpreadsheetCache:
+    """
+    Parsed spreadsheets kept on disk as PagedTables, keyed by file content
+    hash.
+
+    Whichever process parses a file first writes its pages while reading it;
+    every process can then read single pages back without parsing again.
+    The directory is evicted oldest access first once it grows past
+    `max_bytes`.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, digest)
+
+    def open(self, digest: str) -> Optional[PagedTable]:
+        """Return the stored table for this content hash, without parsing anything."""
+        table = PagedTable.open(self._path(digest))
+        if table is not None:
+            try:
+                # Mark as recently used for eviction
+                os.utime(table.path)
+            except FileNotFoundError:
+                return None
+        return table
+
+    def iter_pages(self, file_path: str, digest: str) -> Iterator[pd.DataFrame]:
+        """
+        Yield the pages of a spreadsheet, MAX_ROWS_PER_SHEET rows each. They
+        are read back if the file was parsed before; otherwise each page is
+        stored as it is parsed, and `open(digest)` finds the table once the
+        iterator is exhausted.
+        """
+        table = self.open(digest)
+        if table is not None:
+            for _, page in table.iter_sheets():
+                yield page
+            return
+
+        writer = PagedTableWriter(self._path(digest))
+        try:
+            for chunk in iter_spreadsheet_chunks(file_path):
+                yield writer.write(chunk)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
+        self._evict()
+
+    def load(self, file_path: str, digest: str) -> PagedTable:
+        """Return the stored table for a spreadsheet, parsing and storing it first if needed."""
+        table = self.open(digest)
+        if table is None:
+            for _ in self.iter_pages(file_path, digest):
+                pass
+            table = self.open(digest)
+            if table is None:
+                raise FileNotFoundError(f"Parsed spreadsheet {digest} was evicted while loading")
+        return table
+
+    def _evict(self) -> None:
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".tmp"):
+                # A table still being written
+                continue
+            try:
+                size = sum(page.stat().st_size for page in os.scandir(entry.path))
+                entries.append((entry.stat().st_mtime, size, entry.path))
+            except (FileNotFoundError, NotADirectoryError):
+                pass
+        entries.sort()
+        size = sum(entry_size for _, entry_size, _ in entries)
+        # Never evict the newest table, which was just written
+        for _, entry_size, path in entries[:-1]:
+            if size <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            size -= entry_size
+
+# Shared by this process and its pool workers; point SPREADSHEET_CACHE_DIR
+# at a common directory to share it between server processes too
+spreadsheet_cache = SpreadsheetCache(SPREADSHEET_CACHE_DIR or os.path.join(TEMP_DIR, "spreadsheets"), SPREADSHEET_CACHE_MAX_BYTES)
+
+def load_dataframe(file_path: str, digest: Optional[str] = None) -> pd.DataFrame:
+    """
+    Load a whole spreadsheet as one DataFrame, for analysis.
+
+    Goes through the spreadsheet cache, so each file content is parsed at
+    most once across /analyze and /process and every process sharing the
+    cache directory. Pages are parsed in chunks, so a column whose type
+    differs between pages comes back as object.
+    """
+    digest = digest or file_sha256(file_path)
+    pages = list(spreadsheet_cache.iter_pages(file_path, digest))
+    if not pages:
+        return pd.DataFrame(columns=spreadsheet_cache.load(file_path, digest).headers)
+    return pd.concat(pages) if len(pages) > 1 else pages[0]
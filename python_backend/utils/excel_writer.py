@@ -0,0 +1,32 @@
+from typing import Any, Iterable, Iterator, List, Tuple
+import pandas as pd
+
+# (sheet name, header row, data rows)
+Sheet = Tuple[str, List[str], Iterable[Iterable[Any]]]
+
+def dataframe_rows(df: pd.DataFrame) -> Iterator[Tuple[Any, ...]]:
+    """Yield the rows of a DataFrame as tuples, with missing values as empty cells."""
+    if df.isna().values.any():
+        df = df.astype(object).where(df.notna(), None)
+    return df.itertuples(index=False, name=None)
+
+def write_xlsx(output_path: str, sheets: Iterable[Sheet]) -> int:
+    """
+    Stream sheets into an xlsx file with openpyxl's write-only mode.
+
+    Rows are written as they are pulled from each sheet's iterable instead of
+    building the workbook in memory, so memory stays flat however many rows
+    are exported. Returns the number of data rows written.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    rows_written = 0
+    for name, headers, rows in sheets:
+        worksheet = workbook.create_sheet(title=name)
+        worksheet.append(headers)
+        for row in rows:
+            worksheet.append(row)
+            rows_written += 1
+    workbook.save(output_path)
+    return rows_written
@@ -0,0 +1,87 @@
+import hashlib
+import os
+import re
+from typing import Iterator, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+_UNSAFE_FILENAME_CHARS = re.compile(r'[^\x20-\x7e]|["\\]')
+CHUNK_SIZE = 64 * 1024
+
+def _etag(stat: os.stat_result) -> str:
+    return '"' + hashlib.md5(f"{stat.st_mtime}-{stat.st_size}".encode()).hexdigest() + '"'
+
+def content_disposition(filename: str) -> str:
+    """
+    An attachment Content-Disposition for any file name: a quoted ASCII
+    fallback, plus `filename*` when the name needs encoding (RFC 6266).
+    """
+    fallback = _UNSAFE_FILENAME_CHARS.sub("_", filename)
+    value = f'attachment; filename="{fallback}"'
+    if fallback != filename:
+        value += f"; filename*=utf-8''{quote(filename)}"
+    return value
+
+def _parse_range(match: "re.Match", size: int) -> Optional[Tuple[int, int]]:
+    """Turn a matched `bytes=` range into inclusive (start, end); None if unsatisfiable."""
+    start, end = match.groups()
+    if not start:
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            return None
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return None
+    return start, end
+
+def _iter_file(path: str, start: int, length: int) -> Iterator[bytes]:
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+def ranged_file_response(request: Request, path: str, media_type: str, filename: str) -> Response:
+    """
+    Stream a file with ETag and single-range Range support.
+
+    Returns 304 when If-None-Match matches, 206 for a satisfiable Range
+    (honouring If-Range), 416 for an unsatisfiable one, and otherwise
+    streams the whole file.
+    """
+    stat = os.stat(path)
+    etag = _etag(stat)
+    headers = {"ETag": etag, "Accept-Ranges": "bytes"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+
+    # Malformed or multi-range headers are ignored and get the whole file
+    range_match = _RANGE.match(request.headers.get("range", "").strip())
+    if_range = request.headers.get("if-range")
+    if range_match and any(range_match.groups()) and (not if_range or if_range.strip() == etag):
+        byte_range = _parse_range(range_match, stat.st_size)
+        if byte_range is None:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{stat.st_size}"})
+        start, end = byte_range
+        length = end - start + 1
+        headers.update({
+            "Content-Range": f"bytes {start}-{end}/{stat.st_size}",
+            "Content-Length": str(length),
+            "Content-Disposition": content_disposition(filename),
+        })
+        return StreamingResponse(_iter_file(path, start, length), status_code=206, media_type=media_type, headers=headers)
+
+    # Same Content-Disposition as the 206 branch, instead of FileResponse's own
+    headers["Content-Disposition"] = content_disposition(filename)
+    return FileResponse(path, media_type=media_type, stat_result=stat, headers=headers)
@@ -1,27 +1,307 @@
 
 import os
-import requests
-from fastapi import HTTPException
-from config.settings import FILE_SIZE_LIMITS
+import re
+import time
+import uuid
+import hashlib
+import threading
+from typing import Dict, List, Optional, Tuple
+import httpx
+from fastapi import HTTPException, Request
+from multipart.multipart import MultipartParser, parse_options_header
+from config.settings import (
+    FILE_SIZE_LIMITS, DOWNLOAD_CHUNK_SIZE, DOWNLOAD_CONNECT_TIMEOUT, DOWNLOAD_READ_TIMEOUT,
+    DOWNLOAD_TIMEOUT, DOWNLOAD_MAX_CONNECTIONS
+)
 from utils.temp_files import TEMP_DIR
+from utils.worker_pool import run_io
 
-def check_file_size(file_path: str, file_type: str) -> bool:
-    """Check if file size is within limits."""
+_http_client: Optional[httpx.AsyncClient] = None
+
+def file_size_limit(file_type: str) -> Optional[int]:
+    """Maximum size in bytes for a file type, or None if the type is not accepted."""
     if file_type not in FILE_SIZE_LIMITS:
-        return False
-    
-    file_size_mb = os.path.getsize(file_path) / (1024 * 1024)
-    return file_size_mb <= FILE_SIZE_LIMITS.get(file_type, 5)
-
-def download_file(file_url: str, file_name: str) -> str:
-    """Download file from URL to temporary location."""
-    response = requests.get(file_url, stream=True)
-    if response.status_code != 200:
-        raise HTTPException(status_code=400, detail="Failed to download file")
-    
-    file_path = os.path.join(TEMP_DIR, file_name)
-    with open(file_path, 'wb') as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
-    
-    return file_path
+        return None
+    return int(FILE_SIZE_LIMITS[file_type] * 1024 * 1024)
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared HTTP client for downloads, creating it on first use (connections are kept alive)."""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(DOWNLOAD_READ_TIMEOUT, connect=DOWNLOAD_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=DOWNLOAD_MAX_CONNECTIONS, max_keepalive_connections=DOWNLOAD_MAX_CONNECTIONS),
+            follow_redirects=True
+        )
+    return _http_client
+
+async def close_http_client() -> None:
+    """Close the shared HTTP client."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+# File extensions kept on stored downloads (parsers pick a reader by extension)
+_SAFE_EXT = re.compile(r'^(\.[a-z0-9]{1,8})?$')
+
+class DownloadStore:
+    """
+    Content-addressed store of downloaded source files.
+
+    Downloads stream into a unique `.part` file while being hashed, then move
+    to `<sha256><ext>`. Identical content downloaded by concurrent jobs is kept
+    once: each job holds a reference, and the file is deleted when the last
+    reference is released.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._refs: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def part_path(self) -> str:
+        """A unique path to stream a new download into."""
+        return os.path.join(self.root, f"{uuid.uuid4().hex}.part")
+
+    def add(self, part_path: str, digest: str, file_name: str) -> str:
+        """Move a finished download to its content address and take a reference to it."""
+        ext = os.path.splitext(file_name)[1].lower()
+        if not _SAFE_EXT.match(ext):
+            ext = ""
+        path = os.path.join(self.root, f"{digest}{ext}")
+        with self._lock:
+            if self._refs.get(path) and os.path.exists(path):
+                # Another job holds the same bytes; share its copy
+                os.remove(part_path)
+            else:
+                os.replace(part_path, path)
+            self._refs[path] = self._refs.get(path, 0) + 1
+        return path
+
+    def release(self, path: str) -> None:
+        """Drop a reference, deleting the file when it was the last one."""
+        with self._lock:
+            refs = self._refs.get(path, 0) - 1
+            if refs > 0:
+                self._refs[path] = refs
+                return
+            self._refs.pop(path, None)
+            _remove_file(path)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"files": len(self._refs), "references": sum(self._refs.values())}
+
+# Shared store of downloaded source files
+download_store = DownloadStore(os.path.join(TEMP_DIR, "downloads"))
+
+async def download_file(
+    file_url: str,
+    file_name: str,
+    max_bytes: Optional[int] = None,
+    client: Optional[httpx.AsyncClient] = None
+) -> Tuple[str, str]:
+    """
+    Stream a file from a URL into the download store; returns (path, sha256 hex digest).
+
+    The digest is computed while the bytes arrive. Aborts with 400 as soon as
+    the Content-Length or the bytes received exceed `max_bytes`, and with 504
+    when the transfer takes longer than DOWNLOAD_TIMEOUT seconds. `client`
+    defaults to the shared pooled client. Release the returned path with
+    `release_download` once the file is no longer needed.
+    """
+    client = client or get_http_client()
+    part_path = download_store.part_path()
+    digest = hashlib.sha256()
+    deadline = time.monotonic() + DOWNLOAD_TIMEOUT
+    try:
+        async with client.stream("GET", file_url) as response:
+            if response.status_code != 200:
+                raise HTTPException(status_code=400, detail="Failed to download file")
+
+            content_length = response.headers.get("content-length")
+            if max_bytes is not None and content_length and content_length.isdigit() and int(content_length) > max_bytes:
+                raise HTTPException(status_code=400, detail="File exceeds size limit")
+
+            received = 0
+            with open(part_path, 'wb') as f:
+                async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                    received += len(chunk)
+                    if max_bytes is not None and received > max_bytes:
+                        raise HTTPException(status_code=400, detail="File exceeds size limit")
+                    if time.monotonic() > deadline:
+                        raise HTTPException(status_code=504, detail="Timed out downloading file")
+                    digest.update(chunk)
+                    # Write off the event loop; chunks are large, so the hop is cheap
+                    await run_io(f.write, chunk)
+    except HTTPException:
+        _remove_file(part_path)
+        raise
+    except httpx.TimeoutException:
+        _remove_file(part_path)
+        raise HTTPException(status_code=504, detail="Timed out downloading file")
+    except httpx.HTTPError as e:
+        _remove_file(part_path)
+        raise HTTPException(status_code=400, detail=f"Failed to download file: {str(e)}")
+    except BaseException:
+        _remove_file(part_path)
+        raise
+
+    file_digest = digest.hexdigest()
+    return download_store.add(part_path, file_digest, file_name), file_digest
+
+class ReceivedUpload:
+    """The file part of a multipart request, streamed into a `.part` file of the download store."""
+
+    def __init__(self, part_path: str, digest: str, size: int, filename: str, content_type: str):
+        self.part_path = part_path
+        self.digest = digest
+        self.size = size
+        self.filename = filename
+        self.content_type = content_type
+
+    def discard(self) -> None:
+        """Delete the part file unless `save_upload` has already moved it into the store."""
+        _remove_file(self.part_path)
+
+# Largest accepted file of any type, and of a plain form field
+MAX_UPLOAD_BYTES = max(file_size_limit(file_type) for file_type in FILE_SIZE_LIMITS)
+_MAX_FIELD_BYTES = 64 * 1024
+
+async def receive_upload(
+    request: Request,
+    file_field: str = "file",
+    max_bytes: int = MAX_UPLOAD_BYTES
+) -> Tuple[Dict[str, str], Optional[ReceivedUpload]]:
+    """
+    Parse a multipart/form-data body from the request stream; returns the
+    plain form fields and the `file_field` part, if sent.
+
+    The file part goes straight into a `.part` file of the download store,
+    hashed on the way, instead of being spooled and copied. Aborts with 400
+    once it exceeds `max_bytes`; the limit of its file type is only known
+    once all fields are in, so `save_upload` checks that one. Discard the
+    upload if it is not passed to `save_upload`.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data body")
+
+    # The parser reports parts through callbacks; collect them per chunk
+    events: List[Tuple[str, bytes]] = []
+    def on_data(kind: str):
+        return lambda data, start, end: events.append((kind, data[start:end]))
+    parser = MultipartParser(boundary, {
+        "on_part_begin": lambda: events.append(("part_begin", b"")),
+        "on_header_field": on_data("header_field"),
+        "on_header_value": on_data("header_value"),
+        "on_header_end": lambda: events.append(("header_end", b"")),
+        "on_headers_finished": lambda: events.append(("headers_finished", b"")),
+        "on_part_data": on_data("part_data"),
+        "on_part_end": lambda: events.append(("part_end", b"")),
+    })
+
+    fields: Dict[str, str] = {}
+    upload: Optional[ReceivedUpload] = None
+    f = None
+    digest = None
+    headers: Dict[bytes, bytes] = {}
+    header_field = header_value = b""
+    name = ""
+    value = bytearray()
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            file_data = bytearray()
+            for kind, data in events:
+                if kind == "part_begin":
+                    headers, header_field, header_value = {}, b"", b""
+                    value = bytearray()
+                elif kind == "header_field":
+                    header_field += data
+                elif kind == "header_value":
+                    header_value += data
+                elif kind == "header_end":
+                    headers[header_field.lower()] = header_value
+                    header_field = header_value = b""
+                elif kind == "headers_finished":
+                    _, disposition = parse_options_header(headers.get(b"content-disposition", b""))
+                    name = disposition.get(b"name", b"").decode("latin-1")
+                    if name == file_field and b"filename" in disposition:
+                        if upload is not None:
+                            raise HTTPException(status_code=400, detail=f"More than one '{file_field}' part")
+                        upload = ReceivedUpload(
+                            download_store.part_path(), "", 0,
+                            disposition[b"filename"].decode("utf-8", "replace"),
+                            headers.get(b"content-type", b"").decode("latin-1")
+                        )
+                        f = open(upload.part_path, 'wb')
+                        digest = hashlib.sha256()
+                elif kind == "part_data":
+                    if f is not None:
+                        upload.size += len(data)
+                        if upload.size > max_bytes:
+                            raise HTTPException(status_code=400, detail="File exceeds size limit")
+                        digest.update(data)
+                        file_data += data
+                    else:
+                        value += data
+                        if len(value) > _MAX_FIELD_BYTES:
+                            raise HTTPException(status_code=400, detail=f"Form field '{name}' is too large")
+                elif kind == "part_end":
+                    if f is not None:
+                        await run_io(f.write, bytes(file_data))
+                        file_data = bytearray()
+                        f.close()
+                        f = None
+                        upload.digest = digest.hexdigest()
+                    else:
+                        fields[name] = value.decode("utf-8", "replace")
+            events.clear()
+            if file_data:
+                # One write per chunk received, off the event loop
+                await run_io(f.write, bytes(file_data))
+        parser.finalize()
+        if f is not None:
+            raise HTTPException(status_code=400, detail="Incomplete multipart body")
+    except BaseException:
+        if f is not None:
+            f.close()
+        if upload is not None:
+            upload.discard()
+        raise
+
+    return fields, upload
+
+def save_upload(upload: ReceivedUpload, file_name: str, max_bytes: Optional[int] = None) -> Tuple[str, str]:
+    """
+    Move a received upload to its content address in the download store;
+    returns (path, sha256 hex digest) like `download_file`.
+
+    Fails with 400 when it is larger than `max_bytes`.
+    """
+    if max_bytes is not None and upload.size > max_bytes:
+        upload.discard()
+        raise HTTPException(status_code=400, detail="File exceeds size limit")
+    return download_store.add(upload.part_path, upload.digest, file_name), upload.digest
+
+def release_download(file_path: str) -> None:
+    """Release a file returned by `download_file` or `save_upload`."""
+    download_store.release(file_path)
+
+def _remove_file(file_path: str) -> None:
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+
+def file_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Compute the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -1,20 +1,26 @@
 
-import pandas as pd
 from typing import Dict, Any, List, Optional
 import json
 import os
 
-try:
-    from pandasai import PandasAI
-    from pandasai.llm import OpenAI
-    PANDAS_AI_AVAILABLE = True
-except ImportError:
-    PANDAS_AI_AVAILABLE = False
+from utils.dataframe_loader import load_dataframe, spreadsheet_cache
+from utils.file_utils import file_sha256
+
+def _import_pandasai():
+    """Import PandasAI on first use; it is optional and slow to import."""
+    try:
+        from pandasai import PandasAI
+        from pandasai.llm import OpenAI
+        return PandasAI, OpenAI
+    except ImportError:
+        return None, None
 
 def analyze_data_with_pandasai(
     file_path: str, 
     prompt: str,
-    api_key: Optional[str] = None
+    api_key: Optional[str] = None,
+    digest: Optional[str] = None,
+    output_dir: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Analyze data using PandasAI and a large language model.
@@ -23,11 +29,14 @@ def analyze_data_with_pandasai(
         file_path: Path to the data file (Excel, CSV, etc.)
         prompt: User's analysis request prompt
         api_key: OpenAI API key
+        digest: SHA-256 of the file, if already known
+        output_dir: Directory for generated charts (default: next to the file)
         
     Returns:
         Dictionary containing analysis results
     """
-    if not PANDAS_AI_AVAILABLE:
+    PandasAI, OpenAI = _import_pandasai()
+    if PandasAI is None:
         return {
             "error": "PandasAI is not installed. Please install it with: pip install pandasai"
         }
@@ -40,20 +49,17 @@ def analyze_data_with_pandasai(
             }
     
     try:
-        # Load the data based on file type
-        if file_path.endswith('.csv'):
-            df = pd.read_csv(file_path)
-        elif file_path.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(file_path)
-        else:
+        # Load the data based on file type (parsed once per file content)
+        if not file_path.endswith(('.csv', '.xlsx', '.xls')):
             return {"error": f"Unsupported file format: {file_path.split('.')[-1]}"}
+        df = load_dataframe(file_path, digest)
         
         # Initialize PandasAI with LLM
         llm = OpenAI(api_token=api_key)
         pandas_ai = PandasAI(llm)
         
-        # Run the analysis
-        result = pandas_ai.run(df, prompt)
+        # Run the analysis on a copy, since the loaded frame is shared
+        result = pandas_ai.run(df.copy(), prompt)
         
         # Get dataframe information
         data_summary = {
@@ -74,7 +80,10 @@ def analyze_data_with_pandasai(
         # Handle visualizations if generated
         # This is a simple check - production code would need more robust detection
         if hasattr(result, "figure_"):
-            fig_path = f"{file_path}_analysis_fig.png"
+            if output_dir:
+                fig_path = os.path.join(output_dir, "analysis_fig.png")
+            else:
+                fig_path = f"{file_path}_analysis_fig.png"
             result.figure_.savefig(fig_path)
             response["visualization"] = fig_path
         
@@ -83,21 +92,21 @@ def analyze_data_with_pandasai(
     except Exception as e:
         return {"error": f"Analysis failed: {str(e)}"}
 
-def get_data_preview(file_path: str, max_rows: int = 10) -> Dict[str, Any]:
+def get_data_preview(file_path: str, max_rows: int = 10, digest: Optional[str] = None) -> Dict[str, Any]:
     """Get a preview of the data in a file."""
     try:
-        if file_path.endswith('.csv'):
-            df = pd.read_csv(file_path)
-        elif file_path.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(file_path)
-        else:
+        if not file_path.endswith(('.csv', '.xlsx', '.xls')):
             return {"error": f"Unsupported file format: {file_path.split('.')[-1]}"}
+        # Only the first page is read; the file is parsed into the shared
+        # spreadsheet cache, where the analysis finds it
+        table = spreadsheet_cache.load(file_path, digest or file_sha256(file_path))
+        head = table.sheet(0)[1].head(max_rows) if table.sheet_count else None
             
         return {
-            "columns": df.columns.tolist(),
-            "rows": df.head(max_rows).to_dict(orient="records"),
-            "total_rows": len(df),
-            "total_columns": len(df.columns)
+            "columns": table.headers,
+            "rows": head.to_dict(orient="records") if head is not None else [],
+            "total_rows": table.total_rows,
+            "total_columns": len(table.headers)
         }
     except Exception as e:
         return {"error": f"Failed to preview data: {str(e)}"}
@@ -1,11 +1,25 @@
-
 import os
+import time
+import uuid
+import asyncio
 import tempfile
 import shutil
-from typing import List
+from typing import Callable, List
+from fastapi import HTTPException
+
+from utils.worker_pool import run_io
+from config.settings import SCRATCH_DIR, SCRATCH_MAX_BYTES, SCRATCH_TTL, SCRATCH_SWEEP_INTERVAL
+
+TEMP_DIR_PREFIX = "document_processor_"
 
-# Create a temporary directory for file operations
-TEMP_DIR = tempfile.mkdtemp(prefix="document_processor_")
+# Create a temporary directory for file operations. It lives under
+# SCRATCH_DIR, which can point at a tmpfs such as /dev/shm.
+TEMP_DIR = tempfile.mkdtemp(prefix=TEMP_DIR_PREFIX, dir=SCRATCH_DIR)
+
+# Owner marker, so sweepers in other processes can tell a live directory from
+# one left behind by a crash
+with open(os.path.join(TEMP_DIR, ".pid"), "w") as _pid_file:
+    _pid_file.write(str(os.getpid()))
 
 def cleanup_files(file_paths: List[str]) -> None:
     """Clean up temporary files."""
@@ -18,3 +32,164 @@ def cleanup_files(file_paths: List[str]) -> None:
                     os.remove(file_path)
         except Exception as e:
             print(f"Error cleaning up {file_path}: {str(e)}")
+
+def _dir_size(path: str) -> int:
+    total = 0
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        total += _dir_size(entry.path)
+                    else:
+                        total += entry.stat(follow_symlinks=False).st_size
+                except FileNotFoundError:
+                    pass
+    except FileNotFoundError:
+        pass
+    return total
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class ScratchSpace:
+    """
+    Scratch space of this process: per-job directories under TEMP_DIR, a disk
+    quota, and a sweeper for files that cleanup never reached.
+
+    The quota is global: usage is the size of the temp directories of every
+    process under the scratch root, measured by the sweeper task every
+    `usage_interval` seconds. `check_quota` only compares the last
+    measurement, so it never touches the disk, and rejects new work with 503
+    while usage is over `max_bytes`, the same way admission control does
+    when overloaded.
+    """
+
+    def __init__(self, temp_dir: str, max_bytes: int, ttl: int, usage_interval: float = 5.0):
+        self.temp_dir = temp_dir
+        self.scratch_root = os.path.dirname(temp_dir)
+        self.jobs_dir = os.path.join(temp_dir, "jobs")
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.usage_interval = usage_interval
+        self.rejected = 0
+        self.swept = 0
+        self._sweepers: List[Callable[[], None]] = []
+        self._usage = 0
+        os.makedirs(self.jobs_dir, exist_ok=True)
+
+    def job_dir(self) -> str:
+        """Create a directory for one job's files; remove it with cleanup_files when done."""
+        path = os.path.join(self.jobs_dir, uuid.uuid4().hex)
+        os.makedirs(path)
+        return path
+
+    def usage(self) -> int:
+        """Bytes used by the temp directories of all processes, as last measured."""
+        return self._usage
+
+    def refresh_usage(self) -> int:
+        """Measure usage by walking the temp directories; blocking, so call it through run_io."""
+        total = 0
+        for entry in os.scandir(self.scratch_root):
+            if entry.name.startswith(TEMP_DIR_PREFIX) and entry.is_dir(follow_symlinks=False):
+                total += _dir_size(entry.path)
+        self._usage = total
+        return total
+
+    def check_quota(self) -> None:
+        """Raise 503 while scratch usage is over the quota."""
+        if self._usage >= self.max_bytes:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Scratch space is full, try again shortly",
+                headers={"Retry-After": "30"}
+            )
+
+    def add_sweeper(self, sweeper: Callable[[], None]) -> None:
+        """Also call `sweeper` on every sweep, for stores that expire their own files."""
+        self._sweepers.append(sweeper)
+
+    def sweep(self) -> None:
+        """
+        Remove leftovers: this process's job directories and partial
+        downloads older than the TTL, and the temp directories of processes
+        that are no longer running. Then run the registered sweepers.
+        """
+        cutoff = time.time() - self.ttl
+        for parent in (self.jobs_dir, os.path.join(self.temp_dir, "downloads")):
+            if not os.path.isdir(parent):
+                continue
+            for entry in os.scandir(parent):
+                try:
+                    if parent != self.jobs_dir and not entry.name.endswith(".part"):
+                        # Finished downloads are refcounted by the download store
+                        continue
+                    if entry.stat(follow_symlinks=False).st_mtime < cutoff:
+                        cleanup_files([entry.path])
+                        self.swept += 1
+                except FileNotFoundError:
+                    pass
+
+        for entry in os.scandir(self.scratch_root):
+            if not entry.name.startswith(TEMP_DIR_PREFIX) or entry.path == self.temp_dir:
+                continue
+            try:
+                if not entry.is_dir(follow_symlinks=False):
+                    continue
+                with open(os.path.join(entry.path, ".pid")) as f:
+                    owner_alive = _pid_alive(int(f.read().strip()))
+            except (OSError, ValueError):
+                # No marker: written before markers existed, or half created; go by age
+                try:
+                    owner_alive = entry.stat(follow_symlinks=False).st_mtime >= cutoff
+                except OSError:
+                    continue
+            if not owner_alive:
+                print(f"Removing orphaned temporary directory: {entry.path}")
+                shutil.rmtree(entry.path, ignore_errors=True)
+                self.swept += 1
+
+        for sweeper in self._sweepers:
+            try:
+                sweeper()
+            except Exception as e:
+                print(f"Error in scratch sweeper {sweeper}: {str(e)}")
+
+        self.refresh_usage()
+
+    async def run_sweeper(self, interval: float = SCRATCH_SWEEP_INTERVAL) -> None:
+        """
+        Sweep every `interval` seconds and re-measure usage every
+        `usage_interval` seconds in between, until cancelled.
+        """
+        last_sweep = None
+        while True:
+            try:
+                if last_sweep is None or time.monotonic() - last_sweep >= interval:
+                    last_sweep = time.monotonic()
+                    await run_io(self.sweep)
+                else:
+                    await run_io(self.refresh_usage)
+            except Exception as e:
+                print(f"Error sweeping scratch space: {str(e)}")
+            await asyncio.sleep(self.usage_interval)
+
+    def stats(self) -> dict:
+        return {
+            "dir": self.temp_dir,
+            "usage_bytes": self.usage(),
+            "max_bytes": self.max_bytes,
+            "rejected": self.rejected,
+            "swept": self.swept
+        }
+
+# Shared scratch space of this process
+scratch = ScratchSpace(TEMP_DIR, SCRATCH_MAX_BYTES, SCRATCH_TTL)
@@ -0,0 +1,109 @@
+import asyncio
+import functools
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Optional
+from fastapi import HTTPException
+
+from config.settings import CPU_WORKERS, IO_WORKERS, MAX_INFLIGHT_JOBS, MAX_QUEUED_JOBS
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_thread_pool: Optional[ThreadPoolExecutor] = None
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Return the shared process pool for CPU-bound work, creating it on first use."""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=CPU_WORKERS)
+    return _process_pool
+
+def get_thread_pool() -> ThreadPoolExecutor:
+    """Return the shared thread pool for blocking I/O, creating it on first use."""
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+    return _thread_pool
+
+async def run_cpu(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run a CPU-bound function in the process pool without blocking the event loop."""
+    global _process_pool
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_process_pool(), functools.partial(func, *args, **kwargs))
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM on a huge page); replace the pool so later jobs still run
+        print("Process pool is broken, recreating it")
+        _process_pool = None
+        raise
+
+async def run_io(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run a blocking I/O function in the thread pool without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_thread_pool(), functools.partial(func, *args, **kwargs))
+
+def shutdown_pools() -> None:
+    """Shut down the worker pools."""
+    global _process_pool, _thread_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=False, cancel_futures=True)
+        _thread_pool = None
+
+class AdmissionController:
+    """Limit concurrent jobs and reject requests once the wait queue is full."""
+
+    def __init__(self, max_inflight: int, max_queued: int):
+        self.max_inflight = max_inflight
+        self.max_queued = max_queued
+        self.inflight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @asynccontextmanager
+    async def admit(self, reject: bool = True):
+        """
+        Hold a job slot for the duration of the block, or raise 503 on overload.
+
+        With `reject=False` the caller always waits for a slot; for callers
+        that bound their own concurrency, such as the job queue workers.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_inflight)
+
+        if reject and self.inflight >= self.max_inflight and self.waiting >= self.max_queued:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy, please retry later",
+                headers={"Retry-After": "5"}
+            )
+
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.inflight += 1
+        try:
+            yield
+        finally:
+            self.inflight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, int]:
+        """Current load, for health reporting."""
+        return {
+            "inflight": self.inflight,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "max_inflight": self.max_inflight,
+            "max_queued": self.max_queued
+        }
+
+# Shared admission controller for document processing jobs
+admission = AdmissionController(MAX_INFLIGHT_JOBS, MAX_QUEUED_JOBS)